@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.exporter import Exporter, export_job, apply_effects, render_blocks, open_track
+
+TRACKS = 8
+SECONDS = 60
+LONG_SECONDS = 600
+SETTINGS = {'speed': 1.25, 'pitch_correction': True, 'eq_gains': [3.0, 2.0, 0.0, 0.0, -1.0, 0.0, 0.0, 1.0, 2.0, 3.0]}
+
+def make_track(path, seconds, freq=220.0, sr=44100):
+    t = np.arange(sr * seconds) / sr
+    tone = 0.3 * np.sin(2 * np.pi * freq * t)
+    noise = 0.05 * (np.random.rand(len(t)) - 0.5)
+    sf.write(path, np.stack([tone + noise, tone - noise], axis=1).astype(np.float32), sr)
+    return path
+
+def make_tracks(directory):
+    return [make_track(os.path.join(directory, f"track{i}.flac"), SECONDS, 220.0 + 20 * i)
+            for i in range(TRACKS)]
+
+def run_memory(path):
+    tracemalloc.start()
+    data, sr = sf.read(path, always_2d=True, dtype='float32')
+    full = apply_effects(data, sr, SETTINGS)
+    _, full_peak = tracemalloc.get_traced_memory()
+    del data
+    tracemalloc.reset_peak()
+
+    track = open_track(path)
+    written = 0
+    max_diff = 0.0
+    for block in render_blocks(track, SETTINGS):
+        n = min(len(block), len(full) - written)
+        if n > 0:
+            max_diff = max(max_diff, float(np.abs(block[:n] - full[written:written + n]).max()))
+        written += len(block)
+    track.close()
+    _, chunked_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{LONG_SECONDS}s track: whole-signal peak {full_peak / 2**20:7.1f} MiB, "
+          f"chunked peak {(chunked_peak - full.nbytes) / 2**20:6.1f} MiB, max difference {max_diff:.2e}")
+
+def run_sequential(exporter, paths):
+    started = time.perf_counter()
+    for i, path in enumerate(paths):
+        export_job(i, path, exporter.output_path(f"seq{i}.mp3"), SETTINGS)
+    return time.perf_counter() - started
+
+def run_batch(exporter, paths, workers):
+    jobs = [(str(i), path, f"batch{workers}_{i}.mp3", None) for i, path in enumerate(paths)]
+    started = time.perf_counter()
+    batch = exporter.export_batch(jobs, SETTINGS, workers=workers)
+    batch.wait()
+    elapsed = time.perf_counter() - started
+    if batch.failed:
+        print(f"  {batch.failed} job(s) failed")
+    return elapsed
+
+def report(name, elapsed):
+    print(f"{name:<22} {elapsed:7.1f}s  {TRACKS / elapsed * 60:6.1f} tracks/min")
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_tracks(directory)
+        exporter = Exporter(os.path.join(directory, "exports"))
+        print(f"{TRACKS} stereo tracks x {SECONDS}s, speed {SETTINGS['speed']}x with pitch correction")
+        report("sequential", run_sequential(exporter, paths))
+        for workers in sorted({1, os.cpu_count() or 1}):
+            report(f"process pool ({workers})", run_batch(exporter, paths, workers))
+        run_memory(make_track(os.path.join(directory, "long.flac"), LONG_SECONDS))
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import numpy as np
+from pedalboard import Pedalboard, Compressor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.effects import MultiBandLimiter
+
+SECONDS = 20
+
+class LegacyLimiter:
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.board = Pedalboard([Compressor(threshold_db=-12.0, ratio=1.5, attack_ms=10, release_ms=1000)])
+
+    def process(self, data):
+        return self.board.process(data.T, sample_rate=self.sample_rate, reset=False).T
+
+def run(name, limiter, data, sr, block):
+    for start in range(0, 50 * block, block):
+        limiter.process(data[start:start + block])
+
+    timings = []
+    for start in range(0, len(data) - block + 1, block):
+        chunk = data[start:start + block]
+        started = time.perf_counter()
+        limiter.process(chunk)
+        timings.append(time.perf_counter() - started)
+
+    timings = np.array(timings) * 1e6
+    budget = block / sr * 1e6
+    print(f"{name:<22} sr={sr} block={block:<5} mean={timings.mean():7.1f}us  "
+          f"p99={np.percentile(timings, 99):7.1f}us  budget={budget:6.0f}us  "
+          f"load={timings.mean() / budget * 100:5.1f}%")
+
+if __name__ == "__main__":
+    for sr in (44100, 48000):
+        t = np.arange(sr * SECONDS) / sr
+        music = 0.5 * np.sin(2 * np.pi * 110 * t) * (1 + np.sin(2 * np.pi * 0.5 * t)) / 2
+        noise = 0.2 * (np.random.rand(len(t)) - 0.5)
+        data = np.stack([music + noise, music - noise], axis=1).astype(np.float32)
+        for block in (256, 512, 2048):
+            run("pedalboard compressor", LegacyLimiter(sr), data, sr, block)
+            run("4-band LR4 limiter", MultiBandLimiter(sr), data, sr, block)
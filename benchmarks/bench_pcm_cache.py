@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.pcm_cache import PcmCache
+from core.track_source import TrackSource
+
+SECONDS = 240
+BLOCK = 1024
+
+def first_block(make_source, position):
+    # Time from opening a track to the first block of audio after a seek,
+    # i.e. what replaying a track or jumping inside it costs
+    started = time.perf_counter()
+    source = make_source()
+    source.configure(source.samplerate, source.channels, BLOCK)
+    source.seek(position)
+    out = np.zeros((BLOCK, source.channels), dtype=np.float32)
+    while source.render(out, 1.0, False)[0] == 0:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    source.close()
+    return elapsed * 1000
+
+if __name__ == "__main__":
+    sr = 44100
+    t = np.arange(sr * SECONDS) / sr
+    tone = 0.3 * np.sin(2 * np.pi * 220.0 * t) + 0.05 * (np.random.rand(len(t)) - 0.5)
+    data = np.stack([tone, tone[::-1]], axis=1).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "track")
+        sf.write(path, data, sr, format='FLAC')
+        cache = PcmCache(os.path.join(directory, "pcm"))
+        cache.request("track", path)
+        while not cache.get_stats()['memory_bytes']:
+            time.sleep(0.01)
+        pcm = cache.get("track")
+        # A fresh cache over the same directory has only the disk tier
+        mapped = PcmCache(cache.directory).get("track")
+
+        print(f"Stereo {sr} Hz FLAC, {SECONDS}s, open + seek to the middle + first {BLOCK}-frame block")
+        middle = len(data) // 2
+        for name, make_source in (
+            ("full decode", lambda: TrackSource(path, streaming=False)),
+            ("streaming decode", lambda: TrackSource(path, streaming=True)),
+            ("pcm cache, disk", lambda: TrackSource(path, pcm=mapped)),
+            ("pcm cache, memory", lambda: TrackSource(path, pcm=pcm)),
+        ):
+            timings = np.array([first_block(make_source, middle) for _ in range(5)])
+            print(f"{name:<18} mean={timings.mean():8.2f}ms  max={timings.max():8.2f}ms")
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.resampler import Resampler
+
+BLOCK = 2048
+CALLBACKS = 2000
+
+def legacy_resample(data, position, speed, out):
+    indices = position + np.arange(len(out)) * speed
+    valid_indices = indices[indices <= len(data) - 2]
+    idx_floor = valid_indices.astype(int)
+    alpha = (valid_indices - idx_floor)[:, np.newaxis]
+    interpolated = data[idx_floor] * (1.0 - alpha) + data[idx_floor + 1] * alpha
+    out[:len(interpolated)] = interpolated
+    return len(interpolated)
+
+def run(name, func, data, speed):
+    out = np.zeros((BLOCK, data.shape[1]), dtype=np.float32)
+    position = 0.0
+    limit = len(data) - BLOCK * speed - 4
+
+    for _ in range(50):
+        func(data, 0.0, speed, out)
+
+    timings = np.empty(CALLBACKS)
+    for i in range(CALLBACKS):
+        start = time.perf_counter()
+        func(data, position, speed, out)
+        timings[i] = time.perf_counter() - start
+        position += BLOCK * speed
+        if position > limit:
+            position = 0.0
+
+    timings *= 1e6
+    print(f"{name:<12} speed={speed:<5} mean={timings.mean():8.1f}us  "
+          f"p99={np.percentile(timings, 99):8.1f}us  max={timings.max():8.1f}us")
+
+def run_allocations(name, func, data, speed, position):
+    out = np.zeros((BLOCK, data.shape[1]), dtype=np.float32)
+    func(data, position, speed, out)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    func(data, position, speed, out)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<12} speed={speed:<5} bytes allocated per callback: {peak - base}")
+
+if __name__ == "__main__":
+    sr = 44100
+    data = (np.random.rand(sr * 60, 2).astype(np.float32) - 0.5)
+    resampler = Resampler(2, BLOCK)
+
+    for speed in (1.0, 0.75, 1.5):
+        run("legacy", legacy_resample, data, speed)
+        run("resampler", resampler.process, data, speed)
+    for speed in (1.0, 1.5):
+        run_allocations("legacy", legacy_resample, data, speed, 1000.0)
+        run_allocations("resampler", resampler.process, data, speed, 1000.0)
+    print(f"Real-time budget per {BLOCK}-frame callback at {sr} Hz: {BLOCK / sr * 1e6:.0f}us")
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.database import Database
+from ui.playlist_model import PlaylistModel
+
+TRACKS = 50000
+QUERIES = ["к", "ки", "кино", "kino gr", "Земф", "zemfira", "мумий тр", "the", "love", "qqqq"]
+
+SYLLABLES_RU = ["ка", "ро", "ми", "ля", "до", "жи", "зе", "хо", "цой", "ще", "ну", "бе", "го", "ту"]
+SYLLABLES_EN = ["lo", "ve", "the", "night", "ra", "in", "sun", "star", "da", "ky", "mo", "re"]
+NAMES = ["Кино", "Земфира", "Мумий Тролль", "Сплин", "Ария", "Queen", "Radiohead", "The Beatles", "Muse"]
+
+def word(rng, syllables):
+    return "".join(rng.choice(syllables) for _ in range(rng.randint(1, 4))).capitalize()
+
+def make_tracks(count, seed=1):
+    rng = random.Random(seed)
+    tracks = []
+    for i in range(count):
+        syllables = SYLLABLES_RU if rng.random() < 0.5 else SYLLABLES_EN
+        artist = rng.choice(NAMES) if rng.random() < 0.05 else " ".join(word(rng, syllables) for _ in range(rng.randint(1, 2)))
+        title = " ".join(word(rng, syllables) for _ in range(rng.randint(1, 4)))
+        tracks.append({'id': f"{i}_{rng.randint(1, 10**6)}", 'artist': artist, 'title': title, 'url': ""})
+    return tracks
+
+def measure(db, model, query, runs=20):
+    # What one keystroke in the search box costs: the query plus filtering
+    # the playlist model with its result
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        model.set_filter(db.search_tracks(query))
+        timings.append(time.perf_counter() - started)
+    timings = np.array(timings) * 1000
+    return model.rowCount(), timings
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "bench.db"), os.path.join(directory, "blobs"))
+        library = make_tracks(TRACKS)
+        started = time.perf_counter()
+        db.save_tracks(library)
+        print(f"{TRACKS} tracks saved and indexed in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        db.rebuild_search_index()
+        print(f"full index rebuild {time.perf_counter() - started:.2f}s")
+
+        model = PlaylistModel(None)
+        model.set_tracks(db.get_tracks())
+        db.search_tracks("warm up")
+
+        worst = 0.0
+        for query in QUERIES:
+            hits, timings = measure(db, model, query)
+            worst = max(worst, np.percentile(timings, 99))
+            print(f"{query!r:<12} hits={hits:<6} mean={timings.mean():6.2f}ms  p99={np.percentile(timings, 99):6.2f}ms")
+        print(f"worst p99 {worst:.2f}ms")
+        db.close()
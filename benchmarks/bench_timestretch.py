@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.timestretch import TimeStretcher, ArrayReader
+
+BLOCK = 1024
+SECONDS = 30
+
+def run(data, sr, speed):
+    stretcher = TimeStretcher(data.shape[1], sr)
+    stretcher.length = len(data)
+    reader = ArrayReader(data)
+    out = np.zeros((BLOCK, data.shape[1]), dtype=np.float32)
+
+    timings = []
+    produced = 0
+    while not stretcher.finished:
+        start = time.perf_counter()
+        n = stretcher.process(reader.read, speed, out)
+        timings.append(time.perf_counter() - start)
+        if n == 0:
+            break
+        produced += n
+
+    timings = np.array(timings)
+    rtf = timings.sum() / (produced / sr)
+    budget = BLOCK / sr
+    print(f"speed={speed:<4} real-time factor={rtf:6.3f}  "
+          f"p99 block={np.percentile(timings, 99) * 1e6:7.0f}us  max block={timings.max() * 1e6:7.0f}us  "
+          f"budget={budget * 1e6:.0f}us  search={stretcher.delta}")
+
+if __name__ == "__main__":
+    sr = 44100
+    t = np.arange(sr * SECONDS) / sr
+    tone = 0.3 * np.sin(2 * np.pi * 220.0 * t) + 0.2 * np.sin(2 * np.pi * 331.0 * t)
+    noise = 0.05 * (np.random.rand(len(t)) - 0.5)
+    data = np.stack([tone + noise, tone - noise], axis=1).astype(np.float32)
+
+    print(f"Stereo {sr} Hz, {SECONDS}s input, {BLOCK}-frame callbacks")
+    for speed in (0.5, 1.5, 2.0):
+        run(data, sr, speed)
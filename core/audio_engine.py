@@ -1,16 +1,21 @@
 import sounddevice as sd
-import soundfile as sf
 import numpy as np
 import threading
-import queue
+import time
 import os
 from .effects import Equalizer, MultiBandLimiter
+from .streaming import RingBuffer
+from .track_source import TrackSource
 
 class AudioEngine:
     def __init__(self):
         self.stream = None
-        self.data = None
+        self.streaming = True
+        self.pcm_cache = None
+        self.frames = 0
+        self.channels = 2
         self.samplerate = 44100
+        self.output_rate = 44100
         self.position = 0.0
         self.playing = False
         self.volume = 1.0
@@ -19,48 +24,198 @@ class AudioEngine:
         self.limiter = MultiBandLimiter()
         
         self.speed = 1.0
+        self.pitch_correction = True
+        self.crossfade = 0.0
+        self.normalize = True
+        
+        # `current` is the track being rendered, `next` the queued one, and
+        # `audible` the one the callback is playing right now. They differ
+        # only for the few milliseconds of audio buffered between them.
+        self.current = None
+        self.next = None
+        self.audible = None
+        self._sources = {}
+        self._serial = 0
+        self._next_token = 0
+        self._fade_done = None
+        self._fade_total = 0
+        
+        # The DSP thread renders ahead into `output`; the callback only copies.
+        # `output_tags` carries (source position, seek epoch, track serial) for
+        # every frame so the callback can report the audible position, follow
+        # track changes and drop stale audio.
+        self.blocksize = 512
+        self.render_frames = 512
+        self.buffer_frames = 4096
+        self.tap_frames = 16384
+        self.underruns = 0
+        self.output_underflows = 0
+        self.dsp_load = 0.0
+        self._epoch = 0
+        self._seek_pos = 0.0
+        self._seek_serial = None
+        self._render_epoch = -1
+        self._done_epoch = -1
+        self._allocate_buffers()
         
         self.lock = threading.Lock()
+        self._running = True
+        self._render_thread = threading.Thread(target=self._render_loop, daemon=True)
+        self._render_thread.start()
+        
+    def _allocate_buffers(self):
+        self.output = RingBuffer(self.buffer_frames, self.channels)
+        self.output_tags = RingBuffer(self.buffer_frames, 3, dtype=np.float64)
+        self._block = np.zeros((self.render_frames, self.channels), dtype=np.float32)
+        self._mix = np.zeros((self.render_frames, self.channels), dtype=np.float32)
+        self._block_tags = np.zeros((self.render_frames, 3), dtype=np.float64)
+        self._ramp = np.arange(self.render_frames, dtype=np.float64)
+        self._tag_out = np.zeros((max(self.blocksize, self.render_frames), 3), dtype=np.float64)
+        # Post-effects copy of what is played, for meters. Writes that do not
+        # fit are dropped, so a slow reader never holds up the callback.
+        self.tap = RingBuffer(self.tap_frames, self.channels)
+        
+    def load_track(self, file_path=None, file_data=None, streaming=None, key=None, gain_db=None):
+        print(f"AudioEngine loading track...")
+        return self.load_source(self.open_track(file_path, file_data, streaming, key, gain_db))
+
+    def open_track(self, file_path=None, file_data=None, streaming=None, key=None, gain_db=None):
+        # Opening reads and maybe decodes the file, so callers that must not
+        # block run this on a worker thread and hand the result to load_source().
+        return self._open_track(file_path, file_data, streaming, key, gain_db)
+
+    def load_source(self, source):
+        self.playing = False
+        self.clear_next()
+        if source is None:
+            return False
         
-    def load_track(self, file_path=None, file_data=None):
         with self.lock:
-            self.stop()
-            print(f"AudioEngine loading track...")
+            if self.stream is not None and (self.output_rate != source.samplerate
+                                            or self.channels != source.channels):
+                self._close_stream()
+            if self.stream is None:
+                self._set_output_format(source.samplerate, source.channels)
+            source.configure(self.output_rate, self.channels, self.render_frames)
             
-            try:
-                if file_data:
-                    import io
-                    if isinstance(file_data, bytes):
-                        file_data = io.BytesIO(file_data)
-                    data, fs = sf.read(file_data, always_2d=True)
-                elif file_path:
-                    if not os.path.exists(file_path):
-                        print(f"Error: File does not exist at {file_path}")
-                        return False
-                    data, fs = sf.read(file_path, always_2d=True)
-                else:
-                    return False
-                    
-                self.data = data.astype(np.float32)
-                self.samplerate = fs
-                self.position = 0.0
-                self.eq.sample_rate = fs
-                self.limiter.sample_rate = fs
-                return True
-            except Exception as e:
-                print(f"Error loading track: {e}")
-                return False
+            for old in self._sources.values():
+                old.close()
+            self._sources = {}
+            self.current = self._register(source)
+            self.next = None
+            self._fade_done = None
+            self._set_audible(source)
+            self._restart(0.0)
+        return True
+
+    def queue_next(self, file_path=None, file_data=None, key=None, streaming=None, gain_db=None):
+        # Opens the track on a worker thread so the render thread can switch
+        # to it at the exact frame the current one ends.
+        self._next_token += 1
+        token = self._next_token
+        
+        def prepare():
+            source = self._open_track(file_path, file_data, streaming, key, gain_db)
+            if source is None:
+                return
+            with self.lock:
+                if token != self._next_token or self.current is None:
+                    source.close()
+                    return
+                source.configure(self.output_rate, self.channels, self.render_frames)
+                if self.next is not None:
+                    self._sources.pop(self.next.serial, None)
+                    self.next.close()
+                self.next = self._register(source)
+        
+        threading.Thread(target=prepare, daemon=True).start()
+
+    def clear_next(self):
+        self._next_token += 1
+        with self.lock:
+            if self.next is not None:
+                self._sources.pop(self.next.serial, None)
+                self.next.close()
+                self.next = None
+                self._fade_done = None
+
+    def current_key(self):
+        return self.audible.key if self.audible else None
+
+    def set_track_gain(self, key, gain_db):
+        for source in list(self._sources.values()):
+            if source.key == key:
+                source.gain_db = gain_db
+
+    def _open_track(self, file_path, file_data, streaming, key=None, gain_db=None):
+        if streaming is None:
+            streaming = self.streaming
+        source = None
+        try:
+            if file_data:
+                source = TrackSource(file_data, key, streaming)
+            elif file_path:
+                if not os.path.exists(file_path):
+                    print(f"Error: File does not exist at {file_path}")
+                    return None
+                source = TrackSource(file_path, key, streaming, pcm=self._cached_pcm(file_path))
+        except Exception as e:
+            print(f"Error loading track: {e}")
+        if source is not None:
+            source.gain_db = gain_db
+        return source
+
+    def _cached_pcm(self, file_path):
+        cache = self.pcm_cache
+        if cache is None:
+            return None
+        # Blob names are content hashes, so they key the decoded audio too
+        cache_key = os.path.basename(file_path)
+        pcm = cache.get(cache_key)
+        if pcm is None:
+            cache.request(cache_key, file_path)
+        return pcm
+
+    def _register(self, source):
+        self._serial += 1
+        source.serial = self._serial
+        sources = dict(self._sources)
+        sources[source.serial] = source
+        self._sources = sources
+        return source
+
+    def _set_output_format(self, samplerate, channels):
+        self.output_rate = samplerate
+        if channels != self.channels:
+            self.channels = channels
+            self._allocate_buffers()
+        self.eq.sample_rate = samplerate
+        self.limiter.sample_rate = samplerate
+
+    def _set_audible(self, source):
+        self.audible = source
+        self.frames = source.frames
+        self.samplerate = source.samplerate
+
+    def is_loaded(self):
+        return self.current is not None
+
+    def get_duration(self):
+        return self.frames / self.samplerate if self.samplerate else 0.0
+
+    def get_data(self):
+        return self.audible.get_data() if self.audible else None
 
     def play(self):
-        if self.data is None:
+        if not self.is_loaded():
             return
         
         if self.stream is None:
             self.stream = sd.OutputStream(
-                samplerate=self.samplerate,
-                channels=self.data.shape[1],
+                samplerate=self.output_rate,
+                channels=self.channels,
                 callback=self._callback,
-                blocksize=2048
+                blocksize=self.blocksize
             )
             self.stream.start()
         
@@ -71,16 +226,32 @@ class AudioEngine:
 
     def stop(self):
         self.playing = False
-        self.position = 0.0
+        self._close_stream()
+        self._restart(0.0)
+
+    def _close_stream(self):
         if self.stream:
             self.stream.stop()
             self.stream.close()
             self.stream = None
 
+    def close(self):
+        self.stop()
+        self._running = False
+        self._render_thread.join(timeout=1.0)
+        for source in self._sources.values():
+            source.close()
+
     def seek(self, position_seconds):
-        if self.data is not None:
+        if self.is_loaded():
             sample_pos = position_seconds * self.samplerate
-            self.position = max(0.0, min(sample_pos, float(len(self.data))))
+            self._restart(max(0.0, min(sample_pos, float(self.frames))))
+
+    def _restart(self, position):
+        self.position = position
+        self._seek_pos = position
+        self._seek_serial = self.audible.serial if self.audible else None
+        self._epoch += 1
 
     def set_volume(self, volume):
         self.volume = max(0.0, min(1.0, volume))
@@ -89,50 +260,188 @@ class AudioEngine:
         if speed >= 0.0:
             self.speed = speed
 
+    def set_crossfade(self, seconds):
+        self.crossfade = max(0.0, float(seconds))
+
+    def set_blocksize(self, blocksize):
+        # Takes effect the next time the output stream is opened
+        self.blocksize = int(blocksize)
+        if len(self._tag_out) < self.blocksize:
+            self._tag_out = np.zeros((self.blocksize, 3), dtype=np.float64)
+
+    def get_stats(self):
+        return {
+            'underruns': self.underruns,
+            'output_underflows': self.output_underflows,
+            'buffered_ms': self.output.available() * 1000.0 / float(self.output_rate),
+            'dsp_load': self.dsp_load,
+        }
+
     def _callback(self, outdata, frames, time, status):
         if status:
+            if status.output_underflow:
+                self.output_underflows += 1
             print(status)
             
-        if not self.playing or self.data is None:
+        if not self.playing or not self.is_loaded():
             outdata.fill(0)
             return
 
-        indices = self.position + np.arange(frames) * self.speed
-        
-        max_idx = len(self.data) - 2
-        
-        if indices[0] > max_idx:
-            outdata.fill(0)
-            self.playing = False
-            return
-            
-        valid_mask = indices <= max_idx
-        valid_indices = indices[valid_mask]
-        
-        if len(valid_indices) == 0:
-            outdata.fill(0)
-            self.playing = False
-            return
+        epoch = self._epoch
+        output = self.output
+        tags = self.output_tags
+        if len(self._tag_out) < frames:
+            self._tag_out = np.zeros((frames, 3), dtype=np.float64)
+        self._drop_stale(output, tags, epoch)
 
-        idx_floor = valid_indices.astype(int)
-        idx_ceil = idx_floor + 1
-        alpha = (valid_indices - idx_floor)[:, np.newaxis]
-        
-        sample0 = self.data[idx_floor]
-        sample1 = self.data[idx_ceil]
-        
-        interpolated = sample0 * (1.0 - alpha) + sample1 * alpha
-        
-        out_len = len(interpolated)
-        outdata[:out_len] = interpolated
-        if out_len < frames:
-            outdata[out_len:] = 0
-            self.playing = False
-            
-        self.position += frames * self.speed
-        
-        outdata[:] = self.eq.process(outdata)
-        
-        outdata[:] = self.limiter.process(outdata)
+        n = output.read(outdata)
+        if n:
+            self.tap.write(outdata[:n])
+            tags.read(self._tag_out[:n])
+            serial = int(self._tag_out[n - 1, 2])
+            if self.audible is None or serial != self.audible.serial:
+                source = self._sources.get(serial)
+                if source is not None:
+                    self._set_audible(source)
+            self.position = self._tag_out[n - 1, 0]
+        if n < frames:
+            outdata[n:] = 0
+            if self._done_epoch == epoch and output.available() == 0:
+                self.playing = False
+                self.position = float(self.frames)
+            else:
+                self.underruns += 1
         
         outdata *= self.volume
+
+    def _drop_stale(self, output, tags, epoch):
+        tag = self._tag_out
+        while output.available():
+            n = tags.peek(tag[:min(len(tag), output.available())])
+            if tag[0, 1] == epoch:
+                return
+            stale = n - np.count_nonzero(tag[:n, 1] == epoch)
+            output.skip(stale)
+            tags.skip(stale)
+
+    def _render_loop(self):
+        while self._running:
+            idle = (not self.playing or not self.is_loaded()
+                    or self._done_epoch == self._epoch
+                    or self.output.free() < self.render_frames)
+            if idle or not self._render_next():
+                time.sleep(self.render_frames / self.output_rate / 2)
+
+    def _render_next(self):
+        with self.lock:
+            if not self.is_loaded():
+                return False
+            started = time.perf_counter()
+            epoch = self._epoch
+            if epoch != self._render_epoch:
+                self._render_epoch = epoch
+                self._apply_seek()
+
+            block = self._block
+            tags = self._block_tags
+            cur = self.current
+            start_pos = cur.position
+            n, finished = self._render_source(cur, block)
+            self._tag(tags[:n], start_pos, cur.position, cur.serial, epoch)
+            end = n
+
+            nxt = self.next
+            fade_frames = int(self.crossfade * self.output_rate)
+            if nxt is not None and fade_frames > 0 and (self._fade_done is not None
+                                                        or cur.remaining(self.speed) <= fade_frames):
+                end = self._crossfade(block, n, nxt, epoch)
+
+            if finished and nxt is not None:
+                if self._fade_done is None:
+                    # Gapless: the next track starts on the frame after the last one
+                    next_pos = nxt.position
+                    m, _ = self._render_source(nxt, block[n:])
+                    self._tag(tags[n:n + m], next_pos, nxt.position, nxt.serial, epoch)
+                    end = n + m
+                self.current = nxt
+                self.next = None
+                self._fade_done = None
+                self._prune()
+                finished = False
+
+            if end:
+                out = block[:end]
+                out[:] = self.eq.process(out)
+                # Analyzed tracks are already levelled by their gain; the
+                # compressor only covers tracks without loudness data yet.
+                if not (self.normalize and self.current.gain_db is not None):
+                    out[:] = self.limiter.process(out)
+                if self._epoch == epoch:
+                    self.output_tags.write(tags[:end])
+                    self.output.write(out)
+            if finished and self._epoch == epoch:
+                self._done_epoch = epoch
+
+            load = (time.perf_counter() - started) * self.output_rate / len(block)
+            self.dsp_load = 0.9 * self.dsp_load + 0.1 * load
+            return end > 0 or finished
+
+    def _render_source(self, source, out):
+        n, finished = source.render(out, self.speed, self.pitch_correction)
+        if n and self.normalize and source.gain_db:
+            out[:n] *= np.float32(10.0 ** (source.gain_db / 20.0))
+        return n, finished
+
+    def _apply_seek(self):
+        target = self._sources.get(self._seek_serial, self.current)
+        if target is not self.current:
+            # A seek in the outgoing track after the render thread already
+            # switched: put the new track back in the queue from the start.
+            if self.next is not None:
+                self._sources.pop(self.next.serial, None)
+                self.next.close()
+            self.next = self.current
+            self.next.seek(0.0)
+            self.current = target
+        elif self.next is not None and self._fade_done is not None:
+            self.next.seek(0.0)
+        self._fade_done = None
+        self.current.seek(self._seek_pos)
+
+    def _crossfade(self, block, n, nxt, epoch):
+        # Equal-power fade: the outgoing track follows cos, the incoming sin
+        frames = len(block)
+        if self._fade_done is None:
+            self._fade_done = 0
+            self._fade_total = max(1, int(self.current.remaining(self.speed)) + n)
+
+        mix = self._mix[:frames]
+        next_pos = nxt.position
+        m, _ = self._render_source(nxt, mix)
+
+        phase = (self._ramp[:frames] + self._fade_done) * (0.5 * np.pi / self._fade_total)
+        np.minimum(phase, 0.5 * np.pi, out=phase)
+        block[:n] *= np.cos(phase[:n]).astype(np.float32)[:, np.newaxis]
+        mix[:m] *= np.sin(phase[:m]).astype(np.float32)[:, np.newaxis]
+        if m > n:
+            block[n:m] = 0
+            self._tag(self._block_tags[n:m], next_pos, nxt.position, nxt.serial, epoch)
+        block[:m] += mix[:m]
+        self._fade_done += frames
+        return max(n, m)
+
+    def _tag(self, tags, start_pos, end_pos, serial, epoch):
+        n = len(tags)
+        if n == 0:
+            return
+        np.multiply(self._ramp[:n], (end_pos - start_pos) / n, out=tags[:, 0])
+        tags[:, 0] += start_pos
+        tags[:, 1] = epoch
+        tags[:, 2] = serial
+
+    def _prune(self):
+        keep = {s.serial: s for s in (self.current, self.next, self.audible) if s is not None}
+        for serial, source in self._sources.items():
+            if serial not in keep:
+                source.close()
+        self._sources = keep
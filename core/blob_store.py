@@ -0,0 +1,84 @@
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+
+class BlobStore:
+    def __init__(self, root=os.path.join("cache", "blobs")):
+        self.root = root
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if not os.path.exists(path):
+            self._write_atomic(path, lambda f: f.write(data))
+        return digest, path, len(data)
+
+    def put_file(self, src_path, move=True):
+        h = hashlib.sha256()
+        size = 0
+        with open(src_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+                size += len(chunk)
+        digest = h.hexdigest()
+        path = self.path_for(digest)
+
+        if os.path.exists(path):
+            if move:
+                os.remove(src_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if move:
+                shutil.move(src_path, path)
+            else:
+                self._write_atomic(path, lambda f: self._copy_from(src_path, f))
+        return digest, path, size
+
+    def exists(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def open(self, digest):
+        return map_file(self.path_for(digest))
+
+    def read(self, digest):
+        path = self.path_for(digest)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def delete(self, digest):
+        path = self.path_for(digest)
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"Could not remove blob {digest}: {e}")
+
+    def _copy_from(self, src_path, dst):
+        with open(src_path, 'rb') as src:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    def _write_atomic(self, path, writer):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer(f)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+def map_file(path):
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
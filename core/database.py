@@ -1,14 +1,79 @@
 import sqlite3
 import os
 import json
+import threading
+import weakref
+from .blob_store import BlobStore
+from .search import fold, match_query, query_terms, INDEX_VERSION
+
+class ThreadConnection:
+    # Lives in thread-local storage, which Python clears when its thread
+    # exits, so each connection is closed together with its thread
+    def __init__(self, conn, release):
+        self.conn = conn
+        # Not at exit: daemon threads may still be using their connection
+        weakref.finalize(self, release, conn).atexit = False
 
 class Database:
-    def __init__(self, db_path="player_data.db"):
+    # SQLite limits the number of host parameters per statement
+    MAX_PARAMS = 500
+    
+    # Columns added to `tracks` after the original schema
+    TRACK_COLUMNS = (
+        ('audio_path', 'TEXT'),
+        ('audio_size', 'INTEGER'),
+        ('audio_hash', 'TEXT'),
+        ('image_hash', 'TEXT'),
+        ('loudness', 'REAL'),
+        ('true_peak', 'REAL'),
+        ('last_played', 'REAL'),
+        ('pinned', 'INTEGER DEFAULT 0'),
+    )
+
+    def __init__(self, db_path="player_data.db", blob_dir=os.path.join("cache", "blobs")):
         self.db_path = db_path
+        self.blobs = BlobStore(blob_dir)
+        self._local = threading.local()
+        self._connections = set()
+        self._pool_lock = threading.Lock()
+        self._search_ids = None
         self._init_db()
 
+    def _connect(self):
+        holder = getattr(self._local, 'holder', None)
+        conn = holder.conn if holder is not None else None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            # Only takes effect on a new file; older files are switched over
+            # by the first compact() that has enough to reclaim
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.holder = ThreadConnection(conn, self._release)
+            with self._pool_lock:
+                self._connections.add(conn)
+        return conn
+
+    def _release(self, conn):
+        with self._pool_lock:
+            self._connections.discard(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        with self._pool_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = set()
+        self._local = threading.local()
+
     def _init_db(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         c = conn.cursor()
         
         c.execute('''CREATE TABLE IF NOT EXISTS settings
@@ -51,102 +116,389 @@ class Database:
                           audio_blob BLOB,
                           image_blob BLOB)''')
 
+        c.execute("PRAGMA table_info(tracks)")
+        columns = [info[1] for info in c.fetchall()]
+        for column, column_type in self.TRACK_COLUMNS:
+            if column not in columns:
+                c.execute(f"ALTER TABLE tracks ADD COLUMN {column} {column_type}")
+
         c.execute('''CREATE TABLE IF NOT EXISTS deleted_tracks (id TEXT PRIMARY KEY)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS images
+                     (hash TEXT PRIMARY KEY,
+                      thumb BLOB,
+                      art BLOB)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS peaks
+                     (hash TEXT PRIMARY KEY,
+                      data BLOB)''')
         conn.commit()
-        conn.close()
+        
+        # Pages freed by the migration are reclaimed later by compact(), off
+        # the GUI thread
+        self._migrate_audio_blobs(conn)
+        self._init_search(conn)
 
-    def set_setting(self, key, value):
-        conn = sqlite3.connect(self.db_path)
+    def _init_search(self, conn):
+        # Keyed by the tracks rowid. VACUUM may renumber rowids of a table
+        # with a TEXT primary key, so compact() rebuilds the index after one.
+        try:
+            conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS track_search
+                            USING fts5(words, tokenize="unicode61 remove_diacritics 2",
+                                        prefix="1 2 3", detail=none)''')
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search unavailable: {e}")
+            self.search_enabled = False
+            return
+        self.search_enabled = True
+        indexed, total = conn.execute("SELECT (SELECT COUNT(*) FROM track_search), (SELECT COUNT(*) FROM tracks)").fetchone()
+        if indexed != total or self.get_setting("search_index_version") != str(INDEX_VERSION):
+            self.rebuild_search_index()
+
+    def rebuild_search_index(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM track_search")
+            rows = conn.execute("SELECT rowid, artist, title FROM tracks").fetchall()
+            conn.executemany("INSERT INTO track_search (rowid, words) VALUES (?, ?)",
+                             [(rowid, fold(f"{artist or ''} {title or ''}")) for rowid, artist, title in rows])
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                         ("search_index_version", str(INDEX_VERSION)))
+        self._search_ids = None
+
+    def _migrate_audio_blobs(self, conn):
         c = conn.cursor()
-        c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
-        conn.commit()
-        conn.close()
+        c.execute("SELECT id FROM tracks WHERE audio_blob IS NOT NULL")
+        ids = [row[0] for row in c.fetchall()]
+        
+        for track_id in ids:
+            c.execute("SELECT audio_blob FROM tracks WHERE id=?", (track_id,))
+            audio_data = c.fetchone()[0]
+            digest, path, size = self.blobs.put(audio_data)
+            c.execute('''UPDATE tracks SET audio_blob=NULL, audio_path=?, audio_size=?, audio_hash=?
+                         WHERE id=?''', (path, size, digest, track_id))
+            conn.commit()
+        
+        if ids:
+            print(f"Moved {len(ids)} cached tracks to the blob store")
+        return len(ids)
+
+    def set_setting(self, key, value):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
 
     def get_setting(self, key, default=None):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT value FROM settings WHERE key=?", (key,))
-        row = c.fetchone()
-        conn.close()
+        row = self._connect().execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone()
         return row[0] if row else default
 
+    def get_eq_presets(self):
+        try:
+            return json.loads(self.get_setting("eq_presets", "{}"))
+        except ValueError:
+            return {}
+
+    def save_eq_preset(self, name, gains):
+        presets = self.get_eq_presets()
+        presets[name] = [float(g) for g in gains]
+        self.set_setting("eq_presets", json.dumps(presets))
+
+    def delete_eq_preset(self, name):
+        presets = self.get_eq_presets()
+        if presets.pop(name, None) is not None:
+            self.set_setting("eq_presets", json.dumps(presets))
+
     def save_tracks(self, tracks):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+        rows = [(str(t['id']), t['artist'], t['title'], t['url']) for t in tracks]
+        conn = self._connect()
+        with conn:
+            conn.executemany('''INSERT INTO tracks (id, artist, title, url) 
+                                VALUES (?, ?, ?, ?)
+                                ON CONFLICT(id) DO UPDATE SET 
+                                artist=excluded.artist, title=excluded.title, url=excluded.url''',
+                             rows)
+            if self.search_enabled:
+                self._index_tracks(conn, [row[0] for row in rows])
+        self._search_ids = None
+
+    def _index_tracks(self, conn, ids):
+        for i in range(0, len(ids), self.MAX_PARAMS):
+            chunk = ids[i:i + self.MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            found = conn.execute(f"SELECT rowid, artist, title FROM tracks WHERE id IN ({placeholders})",
+                                 chunk).fetchall()
+            conn.executemany("INSERT OR REPLACE INTO track_search (rowid, words) VALUES (?, ?)",
+                             [(rowid, fold(f"{artist or ''} {title or ''}")) for rowid, artist, title in found])
+
+    def search_tracks(self, query, limit=None):
+        # Ids of matching tracks in get_tracks() order, or None when every
+        # track matches
+        expression = match_query(query)
+        if expression is None:
+            return None
+        if not self.search_enabled:
+            terms = query_terms(query)
+            matches = []
+            for track in self.get_tracks():
+                indexed = fold(f"{track['artist']} {track['title']}").split()
+                if all(any(word.startswith(spelling) for spelling in spellings for word in indexed)
+                       for spellings in terms):
+                    matches.append(track['id'])
+            return matches[:limit]
+        # Matching rowids are translated through a cached rowid -> id map:
+        # joining back to `tracks` costs more than the match itself.
+        ids = self._search_ids
+        if ids is None:
+            ids = dict(self._connect().execute("SELECT rowid, id FROM tracks").fetchall())
+            self._search_ids = ids
+        sql = "SELECT rowid FROM track_search WHERE track_search MATCH ?"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        try:
+            rows = self._connect().execute(sql, (expression,)).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"Search for {query!r} failed: {e}")
+            return []
+        return [ids[row[0]] for row in rows if row[0] in ids]
+
+    def sync_tracks(self, tracks):
+        ids = [str(t['id']) for t in tracks]
+        deleted = self.get_deleted_track_ids(ids)
         
+        stored = {}
+        c = self._connect().cursor()
+        for i in range(0, len(ids), self.MAX_PARAMS):
+            chunk = ids[i:i + self.MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            c.execute(f"SELECT id, artist, title, url FROM tracks WHERE id IN ({placeholders})", chunk)
+            for row in c.fetchall():
+                stored[row[0]] = row[1:]
+        
+        kept, added, changed = [], [], []
         for t in tracks:
-            c.execute("SELECT id FROM tracks WHERE id=?", (str(t['id']),))
-            exists = c.fetchone()
-            
-            if exists:
-                c.execute('''UPDATE tracks SET 
-                             artist=?, title=?, url=?
-                             WHERE id=?''',
-                          (t['artist'], t['title'], t['url'], str(t['id'])))
-            else:
-                c.execute('''INSERT INTO tracks 
-                             (id, artist, title, url) 
-                             VALUES (?, ?, ?, ?)''',
-                          (str(t['id']), t['artist'], t['title'], t['url']))
+            track_id = str(t['id'])
+            if track_id in deleted:
+                continue
+            kept.append(t)
+            current = stored.get(track_id)
+            if current is None:
+                added.append(t)
+            elif current != (t['artist'], t['title'], t['url']):
+                changed.append(t)
         
-        conn.commit()
-        conn.close()
+        if added or changed:
+            self.save_tracks(added + changed)
+        return kept, added, changed
 
     def get_tracks(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self._connect()
         c = conn.cursor()
-        c.execute("SELECT id, artist, title, url FROM tracks")
-        rows = c.fetchall()
-        conn.close()
-        
-        tracks = []
-        for row in rows:
-            tracks.append(dict(row))
-        return tracks
+        c.row_factory = sqlite3.Row
+        c.execute("SELECT id, artist, title, url FROM tracks ORDER BY rowid")
+        return [dict(row) for row in c.fetchall()]
 
     def save_track_audio(self, track_id, audio_data):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("UPDATE tracks SET audio_blob=? WHERE id=?", (audio_data, str(track_id)))
-        conn.commit()
-        conn.close()
+        digest, path, size = self.blobs.put(audio_data)
+        self._set_track_audio(track_id, digest, path, size)
+
+    def save_track_audio_file(self, track_id, file_path):
+        digest, path, size = self.blobs.put_file(file_path)
+        self._set_track_audio(track_id, digest, path, size)
+
+    def _set_track_audio(self, track_id, digest, path, size):
+        conn = self._connect()
+        with conn:
+            # Identical audio already analyzed under another track keeps its loudness
+            conn.execute('''UPDATE tracks SET audio_path=?, audio_size=?, audio_hash=?,
+                            loudness=(SELECT loudness FROM tracks WHERE audio_hash=? AND loudness IS NOT NULL LIMIT 1),
+                            true_peak=(SELECT true_peak FROM tracks WHERE audio_hash=? AND loudness IS NOT NULL LIMIT 1)
+                            WHERE id=?''',
+                         (path, size, digest, digest, digest, str(track_id)))
+
+    def get_track_audio_path(self, track_id):
+        row = self._connect().execute("SELECT audio_path FROM tracks WHERE id=?", (str(track_id),)).fetchone()
+        if row and row[0] and os.path.exists(row[0]):
+            return row[0]
+        return None
 
     def get_track_audio(self, track_id):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT audio_blob FROM tracks WHERE id=?", (str(track_id),))
-        row = c.fetchone()
-        conn.close()
+        path = self.get_track_audio_path(track_id)
+        if not path:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def get_tracks_without_loudness(self, limit):
+        rows = self._connect().execute('''SELECT audio_hash, MIN(audio_path) FROM tracks
+                                          WHERE loudness IS NULL AND audio_hash IS NOT NULL AND audio_path IS NOT NULL
+                                          GROUP BY audio_hash LIMIT ?''', (limit,)).fetchall()
+        return [(digest, path) for digest, path in rows if path and os.path.exists(path)]
+
+    def count_tracks_without_loudness(self):
+        row = self._connect().execute('''SELECT COUNT(DISTINCT audio_hash) FROM tracks
+                                         WHERE loudness IS NULL AND audio_hash IS NOT NULL
+                                         AND audio_path IS NOT NULL''').fetchone()
+        return row[0]
+
+    def save_loudness(self, audio_hash, loudness, true_peak):
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE tracks SET loudness=?, true_peak=? WHERE audio_hash=?",
+                         (loudness, true_peak, audio_hash))
+
+    def get_track_loudness(self, track_id):
+        row = self._connect().execute("SELECT loudness, true_peak FROM tracks WHERE id=?",
+                                      (str(track_id),)).fetchone()
+        if row and row[0] is not None:
+            return row[0], row[1]
+        return None, None
+
+    def get_track_peaks(self, track_id):
+        row = self._connect().execute('''SELECT peaks.data FROM tracks
+                                         JOIN peaks ON peaks.hash = tracks.audio_hash
+                                         WHERE tracks.id=?''', (str(track_id),)).fetchone()
         return row[0] if row else None
 
-    def save_track_image(self, track_id, image_data):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("UPDATE tracks SET image_blob=? WHERE id=?", (image_data, str(track_id)))
-        conn.commit()
-        conn.close()
+    def has_track_peaks(self, track_id):
+        row = self._connect().execute('''SELECT 1 FROM tracks
+                                         JOIN peaks ON peaks.hash = tracks.audio_hash
+                                         WHERE tracks.id=?''', (str(track_id),)).fetchone()
+        return row is not None
 
-    def get_track_image(self, track_id):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT image_blob FROM tracks WHERE id=?", (str(track_id),))
-        row = c.fetchone()
-        conn.close()
+    def save_track_peaks(self, track_id, data):
+        conn = self._connect()
+        with conn:
+            conn.execute('''INSERT OR REPLACE INTO peaks (hash, data)
+                            SELECT audio_hash, ? FROM tracks WHERE id=? AND audio_hash IS NOT NULL''',
+                         (data, str(track_id)))
+
+    def touch_track(self, track_id, when):
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE tracks SET last_played=? WHERE id=?", (when, str(track_id)))
+
+    def set_track_pinned(self, track_id, pinned):
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE tracks SET pinned=? WHERE id=?", (1 if pinned else 0, str(track_id)))
+
+    def is_track_pinned(self, track_id):
+        row = self._connect().execute("SELECT pinned FROM tracks WHERE id=?", (str(track_id),)).fetchone()
+        return bool(row and row[0])
+
+    def get_storage_usage(self):
+        # Identical audio is stored once, so sizes are counted per hash
+        row = self._connect().execute('''SELECT COALESCE(SUM(size), 0) FROM
+                                         (SELECT MAX(audio_size) AS size FROM tracks
+                                          WHERE audio_path IS NOT NULL GROUP BY audio_hash)''').fetchone()
+        return row[0]
+
+    def get_eviction_candidates(self, keep_ids=(), limit=64):
+        # Least recently played audio first (never played counts as oldest),
+        # skipping audio that any pinned or kept track refers to
+        # The kept ids go through a temp table, there can be more of them
+        # than bound parameters
+        conn = self._connect()
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS eviction_keep (id TEXT PRIMARY KEY)")
+        with conn:
+            conn.execute("DELETE FROM eviction_keep")
+            conn.executemany("INSERT OR IGNORE INTO eviction_keep (id) VALUES (?)",
+                             [(str(track_id),) for track_id in keep_ids])
+        return conn.execute('''SELECT audio_hash, MAX(audio_size) FROM tracks
+                               WHERE audio_path IS NOT NULL
+                               AND audio_hash NOT IN (SELECT audio_hash FROM tracks
+                                                      WHERE id IN (SELECT id FROM eviction_keep)
+                                                      AND audio_hash IS NOT NULL)
+                               GROUP BY audio_hash HAVING MAX(COALESCE(pinned, 0)) = 0
+                               ORDER BY MAX(COALESCE(last_played, 0)) LIMIT ?''', (limit,)).fetchall()
+
+    def evict_audio(self, audio_hash):
+        # Metadata, loudness and peaks stay; the hash is kept so they are
+        # picked up again if the track is downloaded later.
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE tracks SET audio_path=NULL, audio_size=NULL WHERE audio_hash=?", (audio_hash,))
+        self.blobs.delete(audio_hash)
+
+    def compact(self, pages=256, full_threshold=32 * 1024 * 1024):
+        # Reclaims free pages a few at a time; returns True while some are
+        # left. A file created before incremental auto-vacuum needs one full
+        # VACUUM to switch, done only when enough space is at stake.
+        conn = self._connect()
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            return False
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            if free * page_size < full_threshold:
+                return False
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            if self.search_enabled:
+                self.rebuild_search_index()
+            return False
+        # executescript steps the pragma to completion; execute() frees a
+        # single page per call
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        return free > pages
+
+    def has_image(self, digest):
+        row = self._connect().execute("SELECT 1 FROM images WHERE hash=?", (digest,)).fetchone()
+        return row is not None
+
+    def save_track_image(self, track_id, digest, thumb=None, art=None):
+        conn = self._connect()
+        with conn:
+            if thumb is not None:
+                conn.execute("INSERT OR IGNORE INTO images (hash, thumb, art) VALUES (?, ?, ?)",
+                             (digest, thumb, art))
+            conn.execute("UPDATE tracks SET image_hash=?, image_blob=NULL WHERE id=?", (digest, str(track_id)))
+
+    def get_track_thumbnail(self, track_id, large=False):
+        column = "art" if large else "thumb"
+        row = self._connect().execute(f'''SELECT images.{column} FROM tracks 
+                                         JOIN images ON images.hash = tracks.image_hash 
+                                         WHERE tracks.id=?''', (str(track_id),)).fetchone()
+        return row[0] if row else None
+
+    def get_legacy_track_image(self, track_id):
+        row = self._connect().execute("SELECT image_blob FROM tracks WHERE id=?", (str(track_id),)).fetchone()
         return row[0] if row else None
 
     def mark_track_deleted(self, track_id):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("INSERT OR REPLACE INTO deleted_tracks (id) VALUES (?)", (str(track_id),))
-        c.execute("DELETE FROM tracks WHERE id=?", (str(track_id),))
-        conn.commit()
-        conn.close()
+        conn = self._connect()
+        with conn:
+            c = conn.cursor()
+            c.execute("SELECT audio_hash, image_hash, rowid FROM tracks WHERE id=?", (str(track_id),))
+            row = c.fetchone()
+            if row and self.search_enabled:
+                c.execute("DELETE FROM track_search WHERE rowid=?", (row[2],))
+            c.execute("INSERT OR REPLACE INTO deleted_tracks (id) VALUES (?)", (str(track_id),))
+            c.execute("DELETE FROM tracks WHERE id=?", (str(track_id),))
+            
+            orphaned = False
+            if row and row[0]:
+                # Evicted rows keep the hash (and need its peaks) but no
+                # longer refer to the file
+                c.execute("SELECT 1 FROM tracks WHERE audio_hash=? AND audio_path IS NOT NULL", (row[0],))
+                orphaned = c.fetchone() is None
+                c.execute('''DELETE FROM peaks WHERE hash=?
+                             AND NOT EXISTS (SELECT 1 FROM tracks WHERE audio_hash=?)''', (row[0], row[0]))
+            if row and row[1]:
+                c.execute('''DELETE FROM images WHERE hash=? 
+                             AND NOT EXISTS (SELECT 1 FROM tracks WHERE image_hash=?)''', (row[1], row[1]))
+        
+        if orphaned:
+            self.blobs.delete(row[0])
 
     def is_track_deleted(self, track_id):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute("SELECT 1 FROM deleted_tracks WHERE id=?", (str(track_id),))
-        row = c.fetchone()
-        conn.close()
-        return row is not None
+        return bool(self.get_deleted_track_ids([track_id]))
+
+    def get_deleted_track_ids(self, track_ids):
+        ids = [str(track_id) for track_id in track_ids]
+        c = self._connect().cursor()
+        deleted = set()
+        for i in range(0, len(ids), self.MAX_PARAMS):
+            chunk = ids[i:i + self.MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            c.execute(f"SELECT id FROM deleted_tracks WHERE id IN ({placeholders})", chunk)
+            deleted.update(row[0] for row in c.fetchall())
+        return deleted
@@ -0,0 +1,167 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from .waveform import compute_peaks
+
+class DownloadManager:
+    PRIORITY_PLAY = 0
+    PRIORITY_PREFETCH = 10
+    PRIORITY_LIBRARY = 20
+
+    def __init__(self, vk_client, db, workers=3, on_progress=None, on_finished=None, on_failed=None,
+                 store_cover=None, has_room=None):
+        self.vk_client = vk_client
+        self.db = db
+        self.store_cover = store_cover
+        self.has_room = has_room
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.on_failed = on_failed
+        self.partial_dir = os.path.join(vk_client.cache_dir, "partial")
+        if not os.path.exists(self.partial_dir):
+            os.makedirs(self.partial_dir)
+
+        self.queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._active = set()
+
+        self._workers = []
+        for _ in range(workers):
+            t = threading.Thread(target=self._worker, daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def enqueue(self, track, priority=PRIORITY_LIBRARY):
+        track_id = str(track['id'])
+        with self._lock:
+            if track_id in self._active:
+                return False
+            current = self._pending.get(track_id)
+            if current is not None and current <= priority:
+                return False
+            self._pending[track_id] = priority
+        self.queue.put((priority, next(self._counter), track))
+        return True
+
+    def prioritize(self, track):
+        return self.enqueue(track, self.PRIORITY_PLAY)
+
+    def cache_library(self, tracks):
+        queued = 0
+        for track in tracks:
+            if self.db.get_track_audio_path(track['id']):
+                continue
+            if self.enqueue(track, self.PRIORITY_LIBRARY):
+                queued += 1
+        return queued
+
+    def is_busy(self, track_id, priority=None):
+        # With a priority, a track only queued behind it does not count:
+        # enqueue() at that priority would move it ahead
+        track_id = str(track_id)
+        with self._lock:
+            if track_id in self._active:
+                return True
+            pending = self._pending.get(track_id)
+            return pending is not None and (priority is None or pending <= priority)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending) + len(self._active)
+
+    def cancel_pending(self):
+        with self._lock:
+            self._pending.clear()
+
+    def shutdown(self, timeout=None):
+        # Downloads already running finish unless the timeout runs out first
+        self.cancel_pending()
+        for _ in self._workers:
+            self.queue.put((float('inf'), next(self._counter), None))
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+            for t in self._workers:
+                t.join(max(0.0, deadline - time.monotonic()))
+
+    def _take(self, priority, track):
+        track_id = str(track['id'])
+        with self._lock:
+            # Entries superseded by a higher-priority enqueue (or cancelled)
+            # are left in the heap and dropped here.
+            if self._pending.get(track_id) != priority:
+                return None
+            del self._pending[track_id]
+            self._active.add(track_id)
+        return track_id
+
+    def _worker(self):
+        while True:
+            priority, _, track = self.queue.get()
+            if track is None:
+                break
+
+            track_id = self._take(priority, track)
+            if track_id is None:
+                continue
+
+            # Prefetching and background caching stop at the storage budget; tracks asked
+            # for by the player are always fetched
+            if priority > self.PRIORITY_PLAY and self.has_room and not self.has_room():
+                ok = False
+            else:
+                ok = self._download(track_id, track)
+            with self._lock:
+                self._active.discard(track_id)
+            self._notify(self.on_finished if ok else self.on_failed, track_id)
+
+    def _download(self, track_id, track):
+        try:
+            if self.db.get_track_audio_path(track_id):
+                return True
+
+            part_path = os.path.join(self.partial_dir, f"{track_id}.part")
+            path = self.vk_client.download_track_to_file(
+                track['url'], part_path,
+                progress=lambda done, total: self._notify(self.on_progress, track_id, done, total))
+
+            if not path:
+                return False
+            self.db.save_track_audio_file(track_id, path)
+            self.store_peaks(track_id)
+            self._download_cover(track_id, track)
+            return True
+        except Exception as e:
+            print(f"Download of {track_id} failed: {e}")
+            return False
+
+    def store_peaks(self, track_id):
+        # Done here so the seek bar never has to decode audio to draw itself
+        if self.db.has_track_peaks(track_id):
+            return
+        try:
+            peaks = compute_peaks(self.db.get_track_audio_path(track_id))
+        except Exception as e:
+            print(f"Peak analysis of {track_id} failed: {e}")
+            return
+        if peaks is not None:
+            self.db.save_track_peaks(track_id, peaks.to_bytes())
+
+    def _download_cover(self, track_id, track):
+        if not self.store_cover or not track.get('image_url'):
+            return
+        if self.db.get_track_thumbnail(track_id) is not None:
+            return
+        image_data = self.vk_client.download_image(track['image_url'])
+        if image_data:
+            self.store_cover(track_id, image_data)
+
+    def _notify(self, callback, *args):
+        if callback:
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Download callback error: {e}")
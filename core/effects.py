@@ -1,10 +1,33 @@
-from pedalboard import Pedalboard, PeakFilter, LowShelfFilter, HighShelfFilter, Compressor
+import threading
+import numpy as np
+from scipy.signal import butter, sosfilt
+from pedalboard import Pedalboard, PeakFilter, LowShelfFilter, HighShelfFilter
+
+# Built-in presets; user presets are stored in the settings table
+EQ_PRESETS = {
+    "Flat": [0.0] * 10,
+    "Bass Boost": [6.0, 5.0, 4.0, 2.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+    "Treble Boost": [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 2.0, 4.0, 5.0, 6.0],
+    "Vocal": [-2.0, -2.0, -1.0, 1.0, 3.0, 3.0, 2.0, 1.0, 0.0, -1.0],
+    "Loudness": [5.0, 4.0, 2.0, 0.0, -1.0, 0.0, 0.0, 1.0, 3.0, 4.0],
+}
 
 class Equalizer:
+    # Gains posted from the GUI land in a pending dict, so a burst of slider
+    # ticks collapses into one target per band. process() picks the targets
+    # up at the next block and glides the filters towards them, recomputing
+    # coefficients at most once per block and band.
+    SMOOTHING_MS = 40.0
+    SNAP_DB = 0.05
+
     def __init__(self, sample_rate=44100):
         self.sample_rate = sample_rate
         self.bands = [32, 64, 125, 250, 500, 1000, 2000, 4000, 8000, 16000]
         self.gains = [0.0] * len(self.bands)
+        self._current = [0.0] * len(self.bands)
+        self._pending = {}
+        self._targets = {}
+        self._lock = threading.Lock()
         
         filters = []
         for i, freq in enumerate(self.bands):
@@ -18,26 +41,163 @@ class Equalizer:
             
         self.board = Pedalboard(filters)
 
-    def set_gain(self, band_index, gain_db):
-        if 0 <= band_index < len(self.gains):
-            self.gains[band_index] = gain_db
-            self.board[band_index].gain_db = gain_db
+    def set_gain(self, band_index, gain_db, immediate=False):
+        self.set_gains({band_index: gain_db}, immediate)
+
+    def set_gains(self, gains, immediate=False):
+        # gains: {band: dB} or a full list. All of them become visible to the
+        # render thread in the same block.
+        if not isinstance(gains, dict):
+            gains = dict(enumerate(gains))
+        gains = {band: float(gain) for band, gain in gains.items() if 0 <= band < len(self.gains)}
+        with self._lock:
+            for band, gain in gains.items():
+                self.gains[band] = gain
+            if immediate:
+                for band in gains:
+                    self._pending.pop(band, None)
+            else:
+                self._pending.update(gains)
+        if immediate:
+            for band, gain in gains.items():
+                self._targets.pop(band, None)
+                self._current[band] = gain
+                self.board[band].gain_db = gain
+
+    def _update_filters(self, frames):
+        if self._pending:
+            with self._lock:
+                targets, self._pending = self._pending, {}
+            self._targets.update(targets)
+        targets = self._targets
+        if not targets:
+            return
+
+        keep = np.exp(-1000.0 * frames / (self.SMOOTHING_MS * self.sample_rate))
+        for band, target in list(targets.items()):
+            gain = target + (self._current[band] - target) * keep
+            if abs(gain - target) < self.SNAP_DB:
+                gain = target
+                del targets[band]
+            self._current[band] = gain
+            self.board[band].gain_db = gain
 
     def process(self, data):
+        self._update_filters(len(data))
         input_data = data.T
         output_data = self.board.process(input_data, sample_rate=self.sample_rate, reset=False)
         return output_data.T
 
 class MultiBandLimiter:
-    def __init__(self, sample_rate=44100):
+    # Linkwitz-Riley (LR4) band split with a compressor per band. Detection
+    # runs on short hops; the gain is smoothed with attack/release between
+    # hops and ramped per sample, and all filter state survives across blocks.
+    def __init__(self, sample_rate=44100, crossovers=(120.0, 2000.0, 8000.0)):
         self.sample_rate = sample_rate
-        self.compressor = Compressor(threshold_db=-12.0, ratio=1.5, attack_ms=10, release_ms=1000)
-        self.board = Pedalboard([self.compressor])
+        self.crossovers = list(crossovers)
+        self.hop = 64
+        bands = len(self.crossovers) + 1
+        self.threshold_db = np.full(bands, -12.0)
+        self.knee_width_db = np.full(bands, 6.0)
+        self.ratio = np.full(bands, 1.5)
+        self.attack_ms = np.full(bands, 10.0)
+        self.release_ms = np.full(bands, 1000.0)
+        self.makeup_db = np.zeros(bands)
+        self.gain_reduction_db = np.zeros(bands)
+        self._design_key = None
 
     def set_params(self, threshold_db, knee_width_db, ratio, attack_time, release_time):
-        pass
+        for band in range(len(self.ratio)):
+            self.set_band_params(band, threshold_db, knee_width_db, ratio, attack_time, release_time)
+
+    def set_band_params(self, band, threshold_db=None, knee_width_db=None, ratio=None,
+                        attack_time=None, release_time=None, makeup_db=None):
+        if threshold_db is not None:
+            self.threshold_db[band] = threshold_db
+        if knee_width_db is not None:
+            self.knee_width_db[band] = max(0.0, knee_width_db)
+        if ratio is not None:
+            self.ratio[band] = max(1.0, ratio)
+        if attack_time is not None:
+            self.attack_ms[band] = max(0.01, attack_time)
+        if release_time is not None:
+            self.release_ms[band] = max(0.01, release_time)
+        if makeup_db is not None:
+            self.makeup_db[band] = makeup_db
+
+    def reset(self):
+        self._design_key = None
+
+    def _design(self, channels):
+        self._design_key = (self.sample_rate, channels, tuple(self.crossovers))
+        lowpass = []
+        self.highpass = []
+        allpass = []
+        for fc in self.crossovers:
+            lp = butter(2, fc, 'low', fs=self.sample_rate, output='sos')
+            hp = butter(2, fc, 'high', fs=self.sample_rate, output='sos')
+            lowpass.append(np.vstack((lp, lp)))
+            self.highpass.append(np.vstack((hp, hp)))
+            # LP4 + HP4 of a Linkwitz-Riley pair is this 2nd-order allpass
+            a = lp[0, 3:]
+            allpass.append(np.array([[a[2], a[1], a[0], a[0], a[1], a[2]]]))
+
+        # Band k also runs through the allpasses of every crossover above it
+        # so that the bands stay in phase and sum flat; the sections are
+        # cascaded into its lowpass to keep one filter call per band.
+        self.lowpass = [np.vstack([lowpass[k]] + allpass[k + 1:]) for k in range(len(self.crossovers))]
+        self.lp_state = [np.zeros((len(sos), 2, channels)) for sos in self.lowpass]
+        self.hp_state = [np.zeros((len(sos), 2, channels)) for sos in self.highpass]
+        self.gain_reduction_db = np.zeros(len(self.crossovers) + 1)
+
+    def split(self, data):
+        bands = []
+        rest = data
+        for k in range(len(self.crossovers)):
+            low, self.lp_state[k] = sosfilt(self.lowpass[k], rest, axis=0, zi=self.lp_state[k])
+            rest, self.hp_state[k] = sosfilt(self.highpass[k], rest, axis=0, zi=self.hp_state[k])
+            bands.append(low)
+        bands.append(rest)
+        return bands
 
     def process(self, data):
-        input_data = data.T
-        output_data = self.board.process(input_data, sample_rate=self.sample_rate, reset=False)
-        return output_data.T
+        if self._design_key != (self.sample_rate, data.shape[1], tuple(self.crossovers)):
+            self._design(data.shape[1])
+        n = len(data)
+        if n == 0:
+            return data
+
+        bands = np.stack(self.split(data))
+        starts = np.arange(0, n, self.hop)
+        peak = np.maximum.reduceat(np.abs(bands).max(axis=2), starts, axis=1)
+        target = self._gain_computer(20.0 * np.log10(np.maximum(peak, 1e-9)))
+
+        # Attack/release smoothing from hop to hop, all bands at once
+        hop_ms = self.hop * 1000.0 / self.sample_rate
+        attack = np.exp(-hop_ms / self.attack_ms)
+        release = np.exp(-hop_ms / self.release_ms)
+        smoothed = np.empty((len(target), len(starts) + 1))
+        smoothed[:, 0] = g = self.gain_reduction_db
+        for t in range(len(starts)):
+            value = target[:, t]
+            g = value + np.where(value < g, attack, release) * (g - value)
+            smoothed[:, t + 1] = g
+        self.gain_reduction_db = g
+
+        # Ramp linearly from the previous hop's gain to this one's
+        index = np.arange(n) // self.hop
+        lengths = np.minimum(starts + self.hop, n) - starts
+        fraction = (np.arange(n) - starts[index] + 1) / lengths[index]
+        gain_db = smoothed[:, index] + (smoothed[:, index + 1] - smoothed[:, index]) * fraction
+        gain = 10.0 ** ((gain_db + self.makeup_db[:, np.newaxis]) / 20.0)
+        return np.einsum('bnc,bn->nc', bands, gain).astype(data.dtype, copy=False)
+
+    def _gain_computer(self, level_db):
+        # Soft knee: quadratic blend of width knee_width_db around the threshold
+        over = level_db - self.threshold_db[:, np.newaxis]
+        knee = self.knee_width_db[:, np.newaxis]
+        slope = (1.0 / self.ratio - 1.0)[:, np.newaxis]
+        target = np.where(over > 0.0, slope * over, 0.0)
+        in_knee = (np.abs(over) <= knee / 2.0) & (knee > 0.0)
+        curve = slope * (over + knee / 2.0) ** 2 / (2.0 * np.maximum(knee, 1e-9))
+        return np.where(in_knee, curve, target)
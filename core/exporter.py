@@ -1,8 +1,230 @@
 import os
+import queue
+import subprocess
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import numpy as np
-import soundfile as sf
-from pydub import AudioSegment
-from pedalboard import Pedalboard
+from .effects import Equalizer, MultiBandLimiter
+from .timestretch import TimeStretcher
+from .resampler import Resampler
+from .streaming import SequentialDecoder
+from .track_source import TrackSource, open_source
+
+EXPORT_BLOCK_FRAMES = 16384
+
+class ExportCancelled(Exception):
+    pass
+
+def effect_settings(engine):
+    # Plain values only: the settings are pickled into worker processes,
+    # which rebuild their own effect chain from them.
+    return {
+        'speed': engine.speed,
+        'pitch_correction': engine.pitch_correction,
+        'eq_gains': list(engine.eq.gains),
+        'normalize': engine.normalize,
+    }
+
+def track_gain(settings):
+    # The per-track loudness gain is added to each job's settings; None when
+    # the track has not been analyzed or normalization is off
+    return settings.get('gain_db') if settings.get('normalize') else None
+
+def level(data, gain_db, limiter):
+    # Same rule as playback: analyzed tracks are levelled by their gain and
+    # skip the compressor, which only covers tracks without loudness data
+    if gain_db is None:
+        return limiter.process(data)
+    return data
+
+def apply_effects(data, sample_rate, settings):
+    # Whole-signal reference for render_blocks(): several full copies of the
+    # track are alive at once, so export itself uses the chunked pipeline.
+    speed = settings.get('speed', 1.0)
+    if speed > 0.0 and speed != 1.0 and settings.get('pitch_correction', True):
+        stretcher = TimeStretcher(data.shape[1], sample_rate, budget=None)
+        data = stretcher.stretch(data, speed)
+    elif speed > 0.0 and speed != 1.0:
+        out = np.zeros((int(len(data) / speed), data.shape[1]), dtype=np.float32)
+        n = Resampler(data.shape[1], len(out)).process(data, 0.0, speed, out)
+        data = out[:n]
+
+    gain_db = track_gain(settings)
+    if gain_db:
+        data = data * np.float32(10.0 ** (gain_db / 20.0))
+    eq, limiter = effect_chain(sample_rate, settings)
+    return level(eq.process(data), gain_db, limiter)
+
+def effect_chain(sample_rate, settings):
+    eq = Equalizer(sample_rate)
+    eq.set_gains(settings.get('eq_gains', []), immediate=True)
+    return eq, MultiBandLimiter(sample_rate)
+
+def open_track(source):
+    track = TrackSource(source, decoder=SequentialDecoder(open_source(source)))
+    track.configure(track.samplerate, track.channels, EXPORT_BLOCK_FRAMES)
+    # Offline: always use the full similarity search so the result does not
+    # depend on machine load.
+    track.stretcher.budget = None
+    return track
+
+def render_blocks(track, settings):
+    # read -> stretch/resample -> EQ -> limiter, one block at a time. The
+    # filters keep their state between blocks (reset=False), so the output
+    # matches apply_effects() while memory stays constant.
+    speed = settings.get('speed', 1.0)
+    if speed <= 0.0:
+        speed = 1.0
+    pitch_correction = settings.get('pitch_correction', True)
+    gain_db = track_gain(settings)
+    eq, limiter = effect_chain(track.samplerate, settings)
+    block = np.zeros((EXPORT_BLOCK_FRAMES, track.channels), dtype=np.float32)
+
+    while True:
+        n, finished = track.render(block, speed, pitch_correction)
+        if n:
+            if gain_db:
+                block[:n] *= np.float32(10.0 ** (gain_db / 20.0))
+            yield level(eq.process(block[:n]), gain_db, limiter)
+        if finished:
+            return
+
+def encoder_command(sample_rate, channels, output_path, bitrate="320k"):
+    return ['ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'f32le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0',
+            '-c:a', 'libmp3lame', '-b:a', bitrate, '-f', 'mp3', output_path]
+
+def export_job(job_id, source, output_path, settings, progress=None, cancel=None):
+    # Runs in a worker process. Rendered blocks are piped straight into
+    # ffmpeg and written under a temporary name, so concurrent jobs never
+    # share a file and a cancelled job leaves nothing behind.
+    def report(fraction):
+        if progress is not None:
+            progress.put((job_id, fraction))
+        if cancel is not None and cancel.is_set():
+            raise ExportCancelled()
+
+    partial_path = output_path + ".part"
+    process = None
+    track = None
+    try:
+        report(0.0)
+        track = open_track(source)
+        process = subprocess.Popen(encoder_command(track.samplerate, track.channels, partial_path),
+                                   stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        reported = 0.0
+        for block in render_blocks(track, settings):
+            process.stdin.write(np.ascontiguousarray(block, dtype=np.float32).tobytes())
+            fraction = track.position / max(track.frames, 1)
+            if fraction - reported >= 0.02:
+                reported = fraction
+                report(fraction)
+        process.stdin.close()
+        error = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(error.decode(errors='replace').strip() or "ffmpeg failed")
+
+        os.replace(partial_path, output_path)
+        return output_path
+    except ExportCancelled:
+        return None
+    except FileNotFoundError:
+        print("FFmpeg not found. Please install FFmpeg and add it to PATH.")
+        return None
+    except Exception as e:
+        print(f"Export error: {e}")
+        return None
+    finally:
+        if process is not None and process.poll() is None:
+            process.kill()
+            process.wait()
+        if track is not None:
+            track.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+class BatchExport:
+    def __init__(self, jobs, settings, workers=None, on_progress=None, on_finished=None, on_done=None):
+        self.jobs = jobs
+        self.settings = settings
+        self.workers = workers or os.cpu_count() or 1
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.on_done = on_done
+        self.completed = 0
+        self.failed = 0
+        self._cancelled = threading.Event()
+        self._cancel = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+        if self._cancel is not None:
+            self._cancel.set()
+
+    def is_running(self):
+        return self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _run(self):
+        # Spawned workers: forking a process that runs Qt and audio threads
+        # is not safe.
+        context = multiprocessing.get_context("spawn")
+        with context.Manager() as manager:
+            progress = manager.Queue()
+            self._cancel = manager.Event()
+            if self._cancelled.is_set():
+                self._cancel.set()
+
+            with ProcessPoolExecutor(max_workers=min(self.workers, max(len(self.jobs), 1)),
+                                     mp_context=context) as pool:
+                pending = {pool.submit(export_job, job_id, source, output_path,
+                                       dict(self.settings, gain_db=gain_db), progress, self._cancel): job_id
+                           for job_id, source, output_path, gain_db in self.jobs}
+                while pending:
+                    done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                    self._drain(progress)
+                    if self._cancelled.is_set():
+                        for future in pending:
+                            future.cancel()
+                    for future in done:
+                        job_id = pending.pop(future)
+                        try:
+                            path = None if future.cancelled() else future.result()
+                        except Exception as e:
+                            print(f"Export worker failed: {e}")
+                            path = None
+                        self._finish(job_id, path)
+                    for future in [f for f in pending if f.cancelled()]:
+                        self._finish(pending.pop(future), None)
+                self._drain(progress)
+
+        if self.on_done:
+            self.on_done(self.completed, self.failed)
+
+    def _drain(self, progress):
+        while True:
+            try:
+                job_id, fraction = progress.get_nowait()
+            except queue.Empty:
+                return
+            if self.on_progress:
+                self.on_progress(job_id, fraction)
+
+    def _finish(self, job_id, path):
+        if path:
+            self.completed += 1
+        elif not self._cancelled.is_set():
+            self.failed += 1
+        if self.on_finished:
+            self.on_finished(job_id, path or "")
 
 class Exporter:
     def __init__(self, output_dir="exports"):
@@ -10,35 +232,23 @@ class Exporter:
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
 
-    def export_track(self, audio_data, sample_rate, output_filename, speed, eq_board, limiter_board):
-        try:
-            data = audio_data
-            sr = sample_rate
-            
-            if abs(speed - 1.0) > 0.01:
-                new_len = int(len(data) / speed)
-                indices = np.linspace(0, len(data) - 1, new_len)
-                resampled_data = np.zeros((new_len, data.shape[1]), dtype=np.float32)
-                for i in range(data.shape[1]):
-                    resampled_data[:, i] = np.interp(indices, np.arange(len(data)), data[:, i])
-                data = resampled_data
-
-            data_T = data.T
-            data_T = eq_board.process(data_T, sample_rate=sr)
-            data_T = limiter_board.process(data_T, sample_rate=sr)
-            
-            temp_wav = os.path.join(self.output_dir, "temp_export.wav")
-            sf.write(temp_wav, data_T.T, sr)
-            
-            output_path = os.path.join(self.output_dir, output_filename)
-            audio = AudioSegment.from_wav(temp_wav)
-            audio.export(output_path, format="mp3", bitrate="320k")
-            
-            if os.path.exists(temp_wav):
-                os.remove(temp_wav)
-            
-            return output_path
-            
-        except Exception as e:
-            print(f"Export error: {e}")
-            return None
+    def output_path(self, output_filename, taken=None):
+        base, ext = os.path.splitext(output_filename)
+        path = os.path.join(self.output_dir, output_filename)
+        n = 2
+        while taken is not None and path in taken:
+            path = os.path.join(self.output_dir, f"{base} ({n}){ext}")
+            n += 1
+        if taken is not None:
+            taken.add(path)
+        return path
+
+    def export_track(self, source, output_filename, settings, gain_db=None):
+        return export_job(None, source, self.output_path(output_filename), dict(settings, gain_db=gain_db))
+
+    def export_batch(self, tracks, settings, workers=None, on_progress=None, on_finished=None, on_done=None):
+        # tracks: (job_id, source, output_filename, gain_db) tuples
+        taken = set()
+        jobs = [(job_id, source, self.output_path(name, taken), gain_db)
+                for job_id, source, name, gain_db in tracks]
+        return BatchExport(jobs, settings, workers, on_progress, on_finished, on_done).start()
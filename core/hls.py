@@ -0,0 +1,164 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+TS_PACKET_SIZE = 188
+MPEG_AUDIO_STREAM_TYPES = (0x03, 0x04)
+ADTS_STREAM_TYPE = 0x0F
+AUDIO_STREAM_TYPES = MPEG_AUDIO_STREAM_TYPES + (ADTS_STREAM_TYPE, 0x11)
+
+_ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+class HlsSegment:
+    def __init__(self, uri, sequence, key_method="NONE", key_uri=None, iv=None):
+        self.uri = uri
+        self.sequence = sequence
+        self.key_method = key_method
+        self.key_uri = key_uri
+        self.iv = iv
+
+def parse_attributes(text):
+    return {k: v.strip('"') for k, v in _ATTRIBUTE_RE.findall(text)}
+
+def parse_playlist(text, base_url):
+    segments = []
+    variants = []
+    sequence = 0
+    key_method, key_uri, iv = "NONE", None, None
+    pending_variant = None
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            sequence = int(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-KEY:'):
+            attrs = parse_attributes(line.split(':', 1)[1])
+            key_method = attrs.get('METHOD', 'NONE')
+            key_uri = urljoin(base_url, attrs['URI']) if 'URI' in attrs else None
+            iv = bytes.fromhex(attrs['IV'][2:]) if 'IV' in attrs else None
+        elif line.startswith('#EXT-X-STREAM-INF:'):
+            pending_variant = parse_attributes(line.split(':', 1)[1])
+        elif line.startswith('#'):
+            continue
+        elif pending_variant is not None:
+            bandwidth = int(pending_variant.get('BANDWIDTH', 0) or 0)
+            variants.append((bandwidth, urljoin(base_url, line)))
+            pending_variant = None
+        else:
+            segments.append(HlsSegment(urljoin(base_url, line), sequence, key_method, key_uri, iv))
+            sequence += 1
+
+    return segments, variants
+
+def decrypt_segment(data, key, iv):
+    if Cipher is None:
+        raise RuntimeError("The 'cryptography' package is required for encrypted HLS streams")
+    decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+    plain = decryptor.update(data) + decryptor.finalize()
+    pad = plain[-1] if plain else 0
+    if 0 < pad <= 16 and plain[-pad:] == bytes([pad]) * pad:
+        plain = plain[:-pad]
+    return plain
+
+def demux_ts_audio(ts):
+    pmt_pid = None
+    audio_pid = None
+    stream_type = None
+    out = bytearray()
+
+    for offset in range(0, len(ts) - TS_PACKET_SIZE + 1, TS_PACKET_SIZE):
+        packet = ts[offset:offset + TS_PACKET_SIZE]
+        if packet[0] != 0x47:
+            continue
+
+        pid = ((packet[1] & 0x1F) << 8) | packet[2]
+        unit_start = packet[1] & 0x40
+        adaptation = (packet[3] >> 4) & 0x3
+        if not adaptation & 0x1:
+            continue
+        start = 4
+        if adaptation & 0x2:
+            start += 1 + packet[4]
+        payload = packet[start:]
+
+        if pid == 0 and pmt_pid is None and unit_start:
+            section = payload[1 + payload[0]:]
+            if len(section) >= 12:
+                # First program entry after the 8-byte section header
+                pmt_pid = ((section[10] & 0x1F) << 8) | section[11]
+        elif pid == pmt_pid and audio_pid is None and unit_start:
+            section = payload[1 + payload[0]:]
+            section_length = ((section[1] & 0x0F) << 8) | section[2]
+            info_length = ((section[10] & 0x0F) << 8) | section[11]
+            pos = 12 + info_length
+            end = min(3 + section_length - 4, len(section))
+            while pos + 5 <= end:
+                es_type = section[pos]
+                es_pid = ((section[pos + 1] & 0x1F) << 8) | section[pos + 2]
+                es_info = ((section[pos + 3] & 0x0F) << 8) | section[pos + 4]
+                if es_type in AUDIO_STREAM_TYPES:
+                    audio_pid, stream_type = es_pid, es_type
+                    break
+                pos += 5 + es_info
+        elif pid == audio_pid:
+            if unit_start and payload[:3] == b'\x00\x00\x01':
+                payload = payload[9 + payload[8]:]
+            out += payload
+
+    return stream_type, bytes(out)
+
+class HlsDownloader:
+    def __init__(self, session, headers=None, workers=6, timeout=30):
+        self.session = session
+        self.headers = headers or {}
+        self.workers = workers
+        self.timeout = timeout
+
+    def fetch_transport_stream(self, url):
+        response = self.session.get(url, headers=self.headers, timeout=self.timeout)
+        response.raise_for_status()
+        segments, variants = parse_playlist(response.text, url)
+
+        if not segments and variants:
+            return self.fetch_transport_stream(max(variants)[1])
+        if not segments:
+            return None
+
+        keys = {}
+        for segment in segments:
+            if segment.key_method == "AES-128" and segment.key_uri not in keys:
+                keys[segment.key_uri] = self._get(segment.key_uri)
+
+        def fetch(segment):
+            data = self._get(segment.uri)
+            if segment.key_method == "AES-128":
+                iv = segment.iv or segment.sequence.to_bytes(16, 'big')
+                data = decrypt_segment(data, keys[segment.key_uri], iv)
+            elif segment.key_method != "NONE":
+                raise RuntimeError(f"Unsupported HLS encryption: {segment.key_method}")
+            return data
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return b''.join(pool.map(fetch, segments))
+
+    def download(self, url):
+        ts = self.fetch_transport_stream(url)
+        if not ts:
+            return None, None
+        stream_type, audio = demux_ts_audio(ts)
+        # MPEG audio and ADTS AAC are playable as demuxed
+        if (stream_type in MPEG_AUDIO_STREAM_TYPES or stream_type == ADTS_STREAM_TYPE) and audio:
+            return audio, None
+        return None, ts
+
+    def _get(self, url):
+        response = self.session.get(url, headers=self.headers, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
@@ -0,0 +1,168 @@
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import soundfile as sf
+from scipy.signal import sosfilt, resample_poly
+from .track_source import open_source
+
+TARGET_LUFS = -14.0
+PEAK_CEILING_DB = -1.0
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+# BS.1770 channel weights: L, R, C, then surround channels
+CHANNEL_WEIGHTS = (1.0, 1.0, 1.0, 1.41, 1.41)
+
+def k_weighting(sample_rate):
+    # BS.1770 pre-filter (high shelf) and RLB high-pass, re-derived for the
+    # given sample rate so tracks do not need to be resampled to 48 kHz.
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * f0 / sample_rate)
+    vh = 10.0 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / sample_rate)
+    a0 = 1.0 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+    return np.array([shelf, highpass])
+
+class LoudnessMeter:
+    # Integrated loudness and true peak of audio fed in blocks, so memory is
+    # bounded by the block size however long the track is. The K-weighting
+    # filter state carries over between blocks, and only one sum of squares
+    # per 100 ms step is kept for the gating at the end.
+    PAD = 64
+
+    def __init__(self, sample_rate, channels):
+        self.sos = k_weighting(sample_rate)
+        self.zi = np.zeros((len(self.sos), 2, channels))
+        self.step = int(round(sample_rate * 0.1))
+        self.channels = channels
+        self.carry = np.zeros((0, channels))
+        self.steps = []
+        self.peak = 0.0
+        self.tail = np.zeros((0, channels), dtype=np.float32)
+
+    def add(self, block):
+        filtered, self.zi = sosfilt(self.sos, block, axis=0, zi=self.zi)
+        squares = np.concatenate((self.carry, filtered * filtered))
+        complete = len(squares) // self.step * self.step
+        if complete:
+            self.steps.append(squares[:complete].reshape(-1, self.step, self.channels).sum(axis=1))
+        self.carry = squares[complete:]
+
+        # 4x oversampled peak; the previous block's last samples go in front
+        # so the polyphase filter sees each sample's neighbours
+        chunk = np.concatenate((self.tail, block))
+        self.peak = max(self.peak, float(np.abs(resample_poly(chunk, 4, 1, axis=0)).max(initial=0.0)))
+        self.tail = chunk[-self.PAD:]
+
+    def loudness(self):
+        # 400 ms blocks every 100 ms
+        steps = np.concatenate(self.steps) if self.steps else np.zeros((0, self.channels))
+        if len(steps) < 4:
+            return ABSOLUTE_GATE
+        block_power = (steps[:-3] + steps[1:-2] + steps[2:-1] + steps[3:]) / (4 * self.step)
+
+        weights = np.array([CHANNEL_WEIGHTS[min(c, len(CHANNEL_WEIGHTS) - 1)] for c in range(self.channels)])
+        power = block_power @ weights
+        with np.errstate(divide='ignore'):
+            loudness = -0.691 + 10.0 * np.log10(power)
+
+        gated = power[loudness > ABSOLUTE_GATE]
+        if len(gated) == 0:
+            return ABSOLUTE_GATE
+        threshold = -0.691 + 10.0 * np.log10(gated.mean()) + RELATIVE_GATE
+        gated = power[loudness > max(threshold, ABSOLUTE_GATE)]
+        return float(-0.691 + 10.0 * np.log10(gated.mean()))
+
+    def true_peak(self):
+        with np.errstate(divide='ignore'):
+            return float(max(20.0 * np.log10(self.peak), ABSOLUTE_GATE)) if self.peak > 0 else ABSOLUTE_GATE
+
+def analyze_file(source, block=1 << 16):
+    with sf.SoundFile(open_source(source)) as f:
+        meter = LoudnessMeter(f.samplerate, f.channels)
+        for data in f.blocks(blocksize=block, dtype='float32', always_2d=True):
+            meter.add(data)
+    return meter.loudness(), meter.true_peak()
+
+def analyze_job(audio_hash, source):
+    try:
+        return audio_hash, analyze_file(source)
+    except Exception as e:
+        print(f"Loudness analysis failed for {source}: {e}")
+        return audio_hash, None
+
+def normalization_gain(loudness, peak, target=TARGET_LUFS, ceiling=PEAK_CEILING_DB):
+    if loudness is None:
+        return None
+    gain = target - loudness
+    if peak is not None:
+        gain = min(gain, ceiling - peak)
+    return gain
+
+class LoudnessAnalyzer:
+    # Works through every stored track whose loudness is still NULL. Results
+    # are written per batch, so an interrupted run resumes where it stopped.
+    def __init__(self, db, workers=None, batch_size=16, on_progress=None, on_analyzed=None):
+        self.db = db
+        self.workers = workers or max(1, (multiprocessing.cpu_count() or 2) - 1)
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.on_analyzed = on_analyzed
+        self.done = 0
+        self._failed = set()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # One thread and one process pool for the whole session; between
+        # runs they wait for the next wakeup
+        with self._lock:
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+
+    def _run(self):
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            while self._running:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                while self._running and self._analyze_batch(pool):
+                    pass
+
+    def _analyze_batch(self, pool):
+        pending = [(h, p) for h, p in self.db.get_tracks_without_loudness(self.batch_size + len(self._failed))
+                   if h not in self._failed][:self.batch_size]
+        if not pending:
+            return False
+
+        remaining = self.db.count_tracks_without_loudness() - len(self._failed)
+        for audio_hash, result in pool.map(analyze_job, *zip(*pending)):
+            if not self._running:
+                return False
+            if result is None:
+                self._failed.add(audio_hash)
+                continue
+            self.db.save_loudness(audio_hash, *result)
+            self.done += 1
+            remaining -= 1
+            if self.on_analyzed:
+                self.on_analyzed(audio_hash, *result)
+            if self.on_progress:
+                self.on_progress(self.done, max(remaining, 0))
+        return True
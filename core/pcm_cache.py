@@ -0,0 +1,186 @@
+import collections
+import os
+import queue
+import struct
+import threading
+import numpy as np
+import soundfile as sf
+from .track_source import open_file
+
+MAGIC = b"PCM1"
+# magic, sample rate, channels, frames; padded so the frames start aligned
+HEADER = struct.Struct("<4sIIQ")
+HEADER_BYTES = 64
+BLOCK_FRAMES = 65536
+
+class PcmCache:
+    # Decoded audio of recently played tracks, so replaying or seeking one
+    # skips the decoder. On disk each track is a small header followed by
+    # raw interleaved float32 frames, memory-mapped in place when reused.
+    # Tracks decoded this session are also held in memory. Both tiers are
+    # bounded by bytes and drop the least recently used track first.
+    def __init__(self, directory=os.path.join("cache", "pcm"), disk_bytes=2 * 2**30,
+                 memory_bytes=256 * 2**20):
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        self.memory_bytes = memory_bytes
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._thread = None
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def get(self, key):
+        # (frames, samplerate) with frames a (frames, channels) float32 array,
+        # or None when the track has not been decoded yet
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+        entry = self._map(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.disk_hits += 1
+        return entry
+
+    def request(self, key, path):
+        # Decodes the track on the cache's own thread; get() finds it next time
+        with self._lock:
+            if key in self._queued or key in self._memory:
+                return
+            self._queued.add(key)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._queue.put((key, path))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+        for name in os.listdir(self.directory):
+            self._remove(os.path.join(self.directory, name))
+
+    def get_stats(self):
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_bytes': self._memory_used,
+        }
+
+    def _run(self):
+        while True:
+            key, path = self._queue.get()
+            try:
+                if not os.path.exists(self.path_for(key)):
+                    self._decode(key, path)
+            except Exception as e:
+                print(f"PCM cache of {key} failed: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(key)
+
+    def _decode(self, key, path):
+        # Block by block into the file, so a long mix costs one block of
+        # memory. A copy is kept in memory only if it fits that budget alone.
+        tmp_path = self.path_for(key) + ".tmp"
+        try:
+            # Read once front to back: a plain file, not a mapping that would
+            # count the whole compressed track as resident
+            with sf.SoundFile(open_file(path)) as f:
+                samplerate, channels = f.samplerate, f.channels
+                size = f.frames * channels * 4
+                if not f.frames or size > self.disk_bytes:
+                    return
+                data = np.empty((f.frames, channels), dtype=np.float32) if size <= self.memory_bytes else None
+                frames = 0
+                with open(tmp_path, 'wb') as out:
+                    out.write(bytes(HEADER_BYTES))
+                    for block in f.blocks(blocksize=BLOCK_FRAMES, dtype='float32', always_2d=True):
+                        block.tofile(out)
+                        if data is not None and frames + len(block) <= len(data):
+                            data[frames:frames + len(block)] = block
+                        else:
+                            data = None
+                        frames += len(block)
+                    # The frame count is only final once decoded
+                    out.seek(0)
+                    out.write(HEADER.pack(MAGIC, samplerate, channels, frames).ljust(HEADER_BYTES, b"\0"))
+            if not frames or frames * channels * 4 > self.disk_bytes:
+                return
+            os.replace(tmp_path, self.path_for(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if data is not None:
+            self._remember(key, (data[:frames], samplerate))
+        self.trim_disk()
+
+    def _map(self, key):
+        path = self.path_for(key)
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(HEADER_BYTES)
+            magic, samplerate, channels, frames = HEADER.unpack_from(header)
+            if magic != MAGIC or os.path.getsize(path) != HEADER_BYTES + frames * channels * 4:
+                self._remove(path)
+                return None
+            data = np.memmap(path, dtype=np.float32, mode='r', offset=HEADER_BYTES, shape=(frames, channels))
+            # The disk tier is trimmed oldest modification time first
+            os.utime(path)
+        except (OSError, struct.error, ValueError):
+            return None
+        return data, samplerate
+
+    def _remember(self, key, entry):
+        size = entry[0].nbytes
+        with self._lock:
+            if key in self._memory or size > self.memory_bytes:
+                return
+            while self._memory and self._memory_used + size > self.memory_bytes:
+                _, (data, _) = self._memory.popitem(last=False)
+                self._memory_used -= data.nbytes
+            self._memory[key] = entry
+            self._memory_used += size
+
+    def trim_disk(self):
+        # Returns the bytes left on disk
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pcm"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        used = sum(size for _, size, _ in files)
+        # Oldest first; when the budget shrinks even the newest may go
+        for _, size, path in sorted(files):
+            if used <= self.disk_bytes:
+                break
+            if self._remove(path):
+                used -= size
+        return used
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            # Still mapped by a playing track on platforms that lock mapped files
+            return False
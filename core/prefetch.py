@@ -0,0 +1,89 @@
+import collections
+
+class Prefetcher:
+    # Downloads what is likely to be played next so starting it is a cache
+    # hit: the next few tracks in play order, the one before the current
+    # (skipping back) and the tracks the user recently jumped to. Only one
+    # prefetch downloads at a time, below playback priority, and the
+    # DownloadManager skips it when the storage budget is full. A failed
+    # download (usually no network) drops the rest of the plan until the
+    # next track starts.
+    def __init__(self, downloads, db, ahead=3, behind=1, recent=4):
+        self.downloads = downloads
+        self.db = db
+        self.ahead = ahead
+        self.behind = behind
+        self.recent = collections.deque(maxlen=recent)
+        self.targets = []
+        self.planned = []
+        self.inflight = None
+        self.prefetched = set()
+        self.hits = 0
+        self.misses = 0
+        self.fetched = 0
+        self.failed = 0
+
+    def plan(self, following, previous=()):
+        seen = set()
+        self.targets = []
+        for track in (*following[:self.ahead], *previous[:self.behind], *self.recent):
+            track_id = str(track['id'])
+            if track_id not in seen:
+                seen.add(track_id)
+                self.targets.append(track)
+        self.planned = list(seen)
+        self._advance()
+
+    def note_jump(self, track):
+        for old in list(self.recent):
+            if str(old['id']) == str(track['id']):
+                self.recent.remove(old)
+        self.recent.appendleft(track)
+
+    def on_started(self, track_id):
+        track_id = str(track_id)
+        if track_id in self.prefetched:
+            self.prefetched.discard(track_id)
+            self.hits += 1
+
+    def record_miss(self):
+        self.misses += 1
+
+    def on_finished(self, track_id, ok):
+        if track_id != self.inflight:
+            return
+        self.inflight = None
+        if ok:
+            self.fetched += 1
+            self.prefetched.add(track_id)
+            self._advance()
+        else:
+            self.failed += 1
+            self.targets = []
+
+    def keep_ids(self):
+        # Fetched or not, planned tracks must not be the first to be evicted
+        return [self.inflight, *self.planned]
+
+    def get_stats(self):
+        starts = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / starts if starts else None,
+            'fetched': self.fetched,
+            'failed': self.failed,
+        }
+
+    def _advance(self):
+        if self.inflight is not None:
+            return
+        while self.targets:
+            track = self.targets.pop(0)
+            track_id = str(track['id'])
+            priority = self.downloads.PRIORITY_PREFETCH
+            if self.db.get_track_audio_path(track_id) or self.downloads.is_busy(track_id, priority):
+                continue
+            if self.downloads.enqueue(track, priority):
+                self.inflight = track_id
+                return
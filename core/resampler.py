@@ -0,0 +1,63 @@
+import numpy as np
+
+class Resampler:
+    # Linear-interpolation resampler for the audio callback. All work buffers
+    # are allocated up front and reused, so process() does not allocate.
+    def __init__(self, channels, max_frames=4096):
+        self.channels = channels
+        self._allocate(max_frames)
+
+    def _allocate(self, frames):
+        self.max_frames = frames
+        self.ramp = np.arange(frames, dtype=np.float64)
+        self.positions = np.empty(frames, dtype=np.float64)
+        self.fraction = np.empty(frames, dtype=np.float64)
+        self.indices = np.empty(frames, dtype=np.intp)
+        self.alpha = np.empty(frames, dtype=np.float32)
+        self.sample0 = np.empty((frames, self.channels), dtype=np.float32)
+        self.sample1 = np.empty((frames, self.channels), dtype=np.float32)
+
+    def input_frames(self, offset, frames, speed):
+        return int(offset - int(offset) + (frames - 1) * speed) + 3
+
+    def process(self, data, offset, speed, out):
+        frames = len(out)
+        if frames > self.max_frames:
+            self._allocate(frames)
+
+        if speed == 1.0 and offset == int(offset):
+            start = int(offset)
+            n = max(0, min(frames, len(data) - start))
+            out[:n] = data[start:start + n]
+            return n
+
+        max_pos = len(data) - 2
+        if offset > max_pos:
+            return 0
+        n = frames if speed <= 0.0 else min(frames, int((max_pos - offset) / speed) + 1)
+
+        pos = self.positions[:n]
+        np.multiply(self.ramp[:n], speed, out=pos)
+        pos += offset
+
+        # Mixed-dtype ufuncs and broadcasting make NumPy allocate scratch
+        # buffers, so every step below stays within a single dtype.
+        frac = self.fraction[:n]
+        np.floor(pos, out=frac)
+        idx = self.indices[:n]
+        np.copyto(idx, frac, casting='unsafe')
+        np.subtract(pos, frac, out=frac)
+        alpha = self.alpha[:n]
+        np.copyto(alpha, frac, casting='same_kind')
+
+        s0 = self.sample0[:n]
+        s1 = self.sample1[:n]
+        np.take(data, idx, axis=0, out=s0, mode='clip')
+        idx += 1
+        np.take(data, idx, axis=0, out=s1, mode='clip')
+
+        np.subtract(s1, s0, out=s1)
+        for c in range(self.channels):
+            np.multiply(s1[:, c], alpha, out=s1[:, c])
+        np.add(s0, s1, out=out[:n])
+        return n
@@ -0,0 +1,58 @@
+import re
+import unicodedata
+
+# Artist and title are indexed in Latin spellings, and queries are
+# folded the same way, so "кино", "Кино" and "kino" all find the same
+# track whichever alphabet either side was typed in.
+CYRILLIC = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'c',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya', 'і': 'i', 'ї': 'yi', 'є': 'e', 'ґ': 'g', 'ў': 'u',
+}
+TRANSLIT = str.maketrans(CYRILLIC)
+# Alternative spellings indexed next to the plain transliteration
+TRANSLIT_ALT = str.maketrans(dict(CYRILLIC, ё='yo'))
+# Bumped whenever the indexed text changes, so stored indexes are rebuilt
+INDEX_VERSION = 2
+# Common alternative Latin spellings of the same Cyrillic letters
+LATIN_VARIANTS = (('kh', 'h'), ('ts', 'c'), ('tz', 'c'), ('j', 'y'), ('w', 'v'), ('x', 'ks'))
+# The FTS5 unicode61 tokenizer also splits on "_", so queries must too
+NON_WORD = re.compile(r"[\W_]+")
+
+def words(text, table=TRANSLIT):
+    # Transliterate before stripping accents, or й would lose its breve
+    text = unicodedata.normalize('NFKD', text.lower().translate(table))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return NON_WORD.sub(" ", text).split()
+
+def variant(word):
+    for spelling, canonical in LATIN_VARIANTS:
+        word = word.replace(spelling, canonical)
+    return word
+
+def fold(text):
+    # Indexed text: every word as transliterated plus its variant-folded
+    # form. Both are needed: "beats" folds to "beac", which "beat" is not a
+    # prefix of.
+    found = words(text)
+    if 'ё' in text.lower():
+        found += words(text, TRANSLIT_ALT)
+    found += [variant(word) for word in found]
+    return " ".join(dict.fromkeys(found))
+
+def query_terms(text):
+    # The spellings to try for each query word. The word still being typed
+    # is matched as typed; variants are only folded into completed words.
+    typed = words(text)
+    complete = len(typed) if NON_WORD.search(text[-1:]) else len(typed) - 1
+    return [list(dict.fromkeys((word, variant(word)))) if i < complete else [word]
+            for i, word in enumerate(typed)]
+
+def match_query(text):
+    # Every word must match as a prefix, so results follow the typing
+    terms = query_terms(text)
+    if not terms:
+        return None
+    return " AND ".join("(" + " OR ".join(f'"{word}"*' for word in spellings) + ")" for spellings in terms)
@@ -0,0 +1,110 @@
+import threading
+import numpy as np
+
+class SpectrumAnalyzer:
+    # Reads the engine's tap ring on its own thread, at most `fps` times a
+    # second. Only the newest audio is analyzed: anything older is skipped,
+    # and the windows of one tick go through a single batched rfft.
+    def __init__(self, engine, fft_size=2048, fps=30, bars=30, low_hz=20.0, high_hz=20000.0,
+                 floor_db=-80.0, fall_db=24.0):
+        self.engine = engine
+        self.fft_size = fft_size
+        self.hop = fft_size // 2
+        self.max_windows = 2
+        self.fps = fps
+        self.bar_count = bars
+        self.low_hz = low_hz
+        self.high_hz = high_hz
+        self.floor_db = floor_db
+        self.fall_db = fall_db
+        self.window = np.hanning(fft_size).astype(np.float32)
+        # Full-scale sine -> 0 dB
+        self.scale = 2.0 / self.window.sum()
+        self.bars = np.full(bars, floor_db)
+        self.levels = np.full(engine.channels, floor_db)
+        self.frame = 0
+        self._snapshot = (0, self.bars.copy(), self.levels.copy())
+        self._layout_key = None
+        self._running = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._stop.set()
+
+    def snapshot(self):
+        # (frame number, bar levels in dB, per-channel peak in dB)
+        return self._snapshot
+
+    def _layout(self, sample_rate):
+        key = (sample_rate, self.fft_size)
+        if key == self._layout_key:
+            return
+        self._layout_key = key
+        edges = np.geomspace(self.low_hz, min(self.high_hz, sample_rate / 2.0), self.bar_count + 1)
+        freqs = np.fft.rfftfreq(self.fft_size, 1.0 / sample_rate)
+        # Bin -> bar index; bins outside the range go to an extra slot that is
+        # dropped. Bars narrower than a bin borrow the bin at their centre.
+        index = np.searchsorted(edges, freqs, side='right') - 1
+        index[(index < 0) | (index >= self.bar_count)] = self.bar_count
+        self._bar_index = index
+        self._bins_per_bar = np.bincount(index, minlength=self.bar_count + 1)[:self.bar_count]
+        centers = np.sqrt(edges[:-1] * edges[1:])
+        self._center_bins = np.clip(np.round(centers * self.fft_size / sample_rate).astype(np.int64),
+                                    0, len(freqs) - 1)
+
+    def _run(self):
+        # At 30 fps a tick brings fewer frames than one FFT window, so the
+        # newest audio is appended to a short history and the windows are
+        # taken from its end.
+        capacity = self.fft_size + self.hop * (self.max_windows - 1)
+        history = None
+        fresh = None
+        while self._running:
+            self._stop.wait(1.0 / self.fps)
+            tap = self.engine.tap
+            self._layout(self.engine.output_rate)
+            if history is None or history.shape[1] != tap.channels:
+                history = np.zeros((capacity, tap.channels), dtype=np.float32)
+                fresh = np.zeros_like(history)
+
+            n = min(tap.available(), capacity)
+            tap.skip(tap.available() - n)
+            n = tap.read(fresh[:n])
+            if n:
+                history[:-n] = history[n:]
+                history[-n:] = fresh[:n]
+                bars, levels = self._analyze(history, fresh[:n])
+            else:
+                bars = np.full(self.bar_count, self.floor_db)
+                levels = np.full(tap.channels, self.floor_db)
+
+            # Meters jump up at once and fall back at fall_db per second
+            fall = self.fall_db / self.fps
+            if len(self.levels) != len(levels):
+                self.levels = np.full(len(levels), self.floor_db)
+            self.bars = np.maximum(bars, self.bars - fall)
+            self.levels = np.maximum(levels, self.levels - fall)
+            self.frame += 1
+            self._snapshot = (self.frame, self.bars.copy(), self.levels.copy())
+
+    def _analyze(self, history, fresh):
+        mono = history.mean(axis=1)
+        windows = np.lib.stride_tricks.sliding_window_view(mono, self.fft_size)[::self.hop]
+        spectrum = np.fft.rfft(windows * self.window, axis=1)
+        power = np.mean(np.abs(spectrum) ** 2, axis=0) * (self.scale * self.scale)
+
+        sums = np.bincount(self._bar_index, weights=power, minlength=self.bar_count + 1)[:self.bar_count]
+        sums = np.where(self._bins_per_bar > 0, sums, power[self._center_bins])
+        with np.errstate(divide='ignore'):
+            bars = np.maximum(10.0 * np.log10(sums), self.floor_db)
+            levels = np.maximum(20.0 * np.log10(np.abs(fresh).max(axis=0)), self.floor_db)
+        return bars, levels
@@ -0,0 +1,103 @@
+import threading
+import time
+
+class StorageManager:
+    # Keeps cached audio under a disk budget. The least recently played audio
+    # is evicted first. Pinned tracks and the ones `keep()` returns (playing,
+    # queued, being fetched) are never evicted, and metadata always stays.
+    # Decoded audio in the PcmCache counts against the same budget and may
+    # use at most PCM_SHARE of it. Eviction and DB compaction run on their
+    # own thread.
+    PCM_SHARE = 0.25
+
+    def __init__(self, db, budget_bytes=0, keep=None, interval=60.0, pcm_cache=None):
+        self.db = db
+        self.keep = keep
+        self.interval = interval
+        self.pcm_cache = pcm_cache
+        self.pcm_limit = pcm_cache.disk_bytes if pcm_cache is not None else 0
+        self.usage_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self.set_budget(budget_bytes)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+
+    def request(self):
+        self._wakeup.set()
+
+    def set_budget(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        if self.pcm_cache is not None:
+            share = int(budget_bytes * self.PCM_SHARE)
+            self.pcm_cache.disk_bytes = min(self.pcm_limit, share) if budget_bytes else self.pcm_limit
+        self._wakeup.set()
+
+    def has_room(self):
+        return not self.budget_bytes or self.usage_bytes < self.budget_bytes
+
+    def touch(self, track_id):
+        self.db.touch_track(track_id, time.time())
+
+    def record_hit(self):
+        self.hits += 1
+
+    def record_miss(self):
+        self.misses += 1
+
+    def get_stats(self):
+        requests = self.hits + self.misses
+        return {
+            'usage_bytes': self.usage_bytes,
+            'budget_bytes': self.budget_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else None,
+            'evicted': self.evicted,
+            'evicted_bytes': self.evicted_bytes,
+        }
+
+    def enforce(self):
+        usage = self.db.get_storage_usage()
+        if self.pcm_cache is not None:
+            usage += self.pcm_cache.trim_disk()
+        while self.budget_bytes and usage > self.budget_bytes:
+            keep = self.keep() if self.keep else ()
+            candidates = self.db.get_eviction_candidates([k for k in keep if k])
+            if not candidates:
+                break
+            for audio_hash, size in candidates:
+                if usage <= self.budget_bytes:
+                    break
+                self.db.evict_audio(audio_hash)
+                usage -= size or 0
+                self.evicted += 1
+                self.evicted_bytes += size or 0
+        self.usage_bytes = usage
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if not self._running:
+                break
+            try:
+                self.enforce()
+                while self._running and self.db.compact():
+                    time.sleep(0.05)
+            except Exception as e:
+                print(f"Storage maintenance error: {e}")
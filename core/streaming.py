@@ -0,0 +1,172 @@
+import threading
+import numpy as np
+import soundfile as sf
+
+class RingBuffer:
+    # Single producer / single consumer: the producer only moves write_pos,
+    # the consumer only moves read_pos, so neither side needs a lock.
+    def __init__(self, capacity, channels, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self.buffer = np.zeros((self.capacity, channels), dtype=dtype)
+        self.read_pos = 0
+        self.write_pos = 0
+
+    def available(self):
+        return self.write_pos - self.read_pos
+
+    def free(self):
+        return self.capacity - self.available()
+
+    def write(self, data):
+        n = min(len(data), self.free())
+        if n <= 0:
+            return 0
+        start = self.write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        if n > first:
+            self.buffer[:n - first] = data[first:n]
+        self.write_pos += n
+        return n
+
+    def peek(self, out):
+        n = min(len(out), self.available())
+        if n <= 0:
+            return 0
+        start = self.read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        if n > first:
+            out[first:n] = self.buffer[:n - first]
+        return n
+
+    def read(self, out):
+        n = self.peek(out)
+        self.read_pos += n
+        return n
+
+    def skip(self, frames):
+        n = max(0, min(frames, self.available()))
+        self.read_pos += n
+        return n
+
+class StreamingDecoder:
+    def __init__(self, source, buffer_seconds=10.0, block_frames=4096):
+        self.file = sf.SoundFile(source)
+        self.samplerate = self.file.samplerate
+        self.channels = self.file.channels
+        self.frames = self.file.frames
+        self.block_frames = block_frames
+        self.capacity = max(int(buffer_seconds * self.samplerate), block_frames * 2)
+
+        # (ring, origin): ring frame 0 holds source frame `origin`. A seek swaps
+        # in a fresh pair with a single assignment instead of resetting the ring
+        # under the reader's feet.
+        self._segment = (RingBuffer(self.capacity, self.channels), 0)
+        self._seek_target = None
+        self._wakeup = threading.Event()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request_seek(self, frame):
+        self._seek_target = max(0, min(int(frame), self.frames))
+        self._wakeup.set()
+
+    def read(self, start, out):
+        ring, origin = self._segment
+        first = origin + ring.read_pos
+        last = origin + ring.write_pos
+
+        if start < first or start > last + self.block_frames:
+            if self._seek_target != start:
+                self.request_seek(start)
+            return 0
+
+        ring.skip(start - first)
+        n = ring.peek(out)
+        self._wakeup.set()
+        return n
+
+    def close(self):
+        self._running = False
+        self._wakeup.set()
+        self._thread.join(timeout=1.0)
+        self.file.close()
+
+    def _run(self):
+        block = np.empty((self.block_frames, self.channels), dtype=np.float32)
+        position = 0
+
+        while self._running:
+            target = self._seek_target
+            if target is not None:
+                self._seek_target = None
+                try:
+                    self.file.seek(target)
+                    position = target
+                except Exception as e:
+                    print(f"Decoder seek error: {e}")
+                self._segment = (RingBuffer(self.capacity, self.channels), position)
+                continue
+
+            ring, origin = self._segment
+            free = ring.free()
+            if free < self.block_frames // 4 or position >= self.frames:
+                self._wakeup.wait(0.05)
+                self._wakeup.clear()
+                continue
+
+            try:
+                data = self.file.read(min(free, self.block_frames), dtype='float32',
+                                      always_2d=True, out=block[:min(free, self.block_frames)])
+            except Exception as e:
+                print(f"Decoder error: {e}")
+                break
+
+            if len(data) == 0:
+                position = self.frames
+                continue
+
+            if self._seek_target is None:
+                ring.write(data)
+            position += len(data)
+
+class SequentialDecoder:
+    # Synchronous counterpart of StreamingDecoder for offline rendering. Reads
+    # are expected to move forward; only the frames from the last read start
+    # onwards are kept, so memory stays bounded for any track length.
+    def __init__(self, source, block_frames=65536):
+        self.file = sf.SoundFile(source)
+        self.samplerate = self.file.samplerate
+        self.channels = self.file.channels
+        self.frames = self.file.frames
+        self.block_frames = block_frames
+        self.buffer = np.zeros((0, self.channels), dtype=np.float32)
+        self.origin = 0
+
+    def request_seek(self, frame):
+        pass
+
+    def read(self, start, out):
+        end = min(start + len(out), self.frames)
+        if start < self.origin or start > self.origin + len(self.buffer):
+            self.file.seek(min(start, self.frames))
+            self.buffer = self.buffer[:0]
+            self.origin = start
+        elif start > self.origin:
+            self.buffer = self.buffer[start - self.origin:]
+            self.origin = start
+
+        missing = end - (self.origin + len(self.buffer))
+        if missing > 0:
+            data = self.file.read(max(missing, self.block_frames), dtype='float32', always_2d=True)
+            self.buffer = np.concatenate((self.buffer, data))
+
+        n = max(0, min(len(out), len(self.buffer)))
+        out[:n] = self.buffer[:n]
+        return n
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,129 @@
+import time
+import numpy as np
+from .streaming import RingBuffer
+
+class ArrayReader:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, start, out):
+        n = max(0, min(len(out), len(self.data) - start))
+        out[:n] = self.data[start:start + n]
+        return n
+
+class TimeStretcher:
+    # Streaming WSOLA: 50% overlap-add of Hann-windowed frames, each frame
+    # placed where it best continues the previous one so pitch is preserved.
+    def __init__(self, channels, samplerate, frame_ms=46.0, search_ms=12.0, budget=0.5):
+        self.channels = channels
+        self.samplerate = samplerate
+        self.frame = 2 ** int(round(np.log2(samplerate * frame_ms / 1000.0)))
+        self.hop = self.frame // 2
+        self.max_delta = int(samplerate * search_ms / 1000.0)
+        self.min_delta = self.max_delta // 8
+        self.delta = self.max_delta
+        self.budget = budget
+        self.load = 0.0
+
+        n = np.arange(self.frame)
+        self.window = (0.5 - 0.5 * np.cos(2.0 * np.pi * n / self.frame)).astype(np.float32)
+
+        region = self.frame + 2 * self.max_delta
+        self.region = np.zeros((region, channels), dtype=np.float32)
+        self.mono = np.zeros(region, dtype=np.float32)
+        self.template = np.zeros(self.hop, dtype=np.float32)
+        self.windowed = np.zeros((self.frame, channels), dtype=np.float32)
+        self.accum = np.zeros((self.frame, channels), dtype=np.float32)
+        self.fifo = RingBuffer(max(8192, 4 * self.frame), channels)
+        self.length = None
+        self.reset(0.0)
+
+    def reset(self, position):
+        self.position = float(position)
+        self.read_floor = int(position)
+        self.first = True
+        self.finished = False
+        self.accum.fill(0)
+        self.fifo.skip(self.fifo.available())
+
+    def process(self, read, speed, out):
+        started = time.perf_counter()
+
+        while self.fifo.available() < len(out) and self.fifo.free() >= self.hop and not self.finished:
+            if not self._step(read, speed):
+                break
+
+        n = self.fifo.read(out)
+        self._adapt(time.perf_counter() - started, len(out))
+        return n
+
+    def stretch(self, data, speed, block=8192):
+        reader = ArrayReader(data)
+        self.length = len(data)
+        self.reset(0.0)
+        out_len = int(len(data) / speed) if speed > 0 else len(data)
+        result = np.zeros((out_len, self.channels), dtype=np.float32)
+        written = 0
+        while written < out_len:
+            n = self.process(reader.read, speed, result[written:written + block])
+            if n == 0:
+                break
+            written += n
+        return result
+
+    def _step(self, read, speed):
+        p = int(self.position)
+        if self.length is not None and p >= self.length:
+            self._flush()
+            return False
+
+        delta = 0 if self.first else self.delta
+        start = max(self.read_floor, p - self.max_delta)
+        lo = max(0, p - delta - start)
+        hi = p + delta - start
+        need = hi + self.frame
+
+        got = read(start, self.region[:need])
+        if got < need:
+            if self.length is None or start + got < self.length:
+                return False
+            self.region[got:need] = 0
+        self.read_floor = start
+
+        if self.first:
+            best = p - start
+        else:
+            mono = self.mono[:hi + self.hop]
+            np.sum(self.region[:hi + self.hop], axis=1, out=mono)
+            corr = np.correlate(mono[lo:], self.template, mode='valid')
+            best = lo + int(np.argmax(corr))
+
+        frame = self.region[best:best + self.frame]
+        np.multiply(frame, self.window[:, np.newaxis], out=self.windowed)
+        self.accum += self.windowed
+        np.sum(frame[self.hop:], axis=1, out=self.template)
+
+        self.fifo.write(self.accum[:self.hop])
+        self.accum[:self.hop] = self.accum[self.hop:]
+        self.accum[self.hop:] = 0
+
+        self.position += self.hop * speed
+        self.first = False
+        return True
+
+    def _flush(self):
+        self.fifo.write(self.accum[:self.hop])
+        self.accum.fill(0)
+        self.finished = True
+
+    def _adapt(self, elapsed, frames):
+        # Track the share of the block's real-time duration spent stretching
+        # and narrow the similarity search when it exceeds the budget.
+        if self.budget is None:
+            return
+        load = elapsed * self.samplerate / max(frames, 1)
+        self.load = 0.9 * self.load + 0.1 * load
+        if self.load > self.budget and self.delta > self.min_delta:
+            self.delta = max(self.min_delta, self.delta // 2)
+        elif self.load < self.budget / 4 and self.delta < self.max_delta:
+            self.delta = min(self.max_delta, self.delta * 2)
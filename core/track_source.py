@@ -0,0 +1,188 @@
+import io
+import mmap
+import subprocess
+import numpy as np
+import soundfile as sf
+from .streaming import StreamingDecoder
+from .resampler import Resampler
+from .timestretch import TimeStretcher
+from .blob_store import map_file
+
+def is_adts(head):
+    # ADTS AAC shares the MPEG audio sync word but always has layer 0
+    return len(head) >= 2 and head[0] == 0xFF and head[1] & 0xF6 == 0xF0
+
+def decode_adts(data):
+    # libsndfile has no AAC decoder, so ffmpeg decodes it to WAV in memory
+    try:
+        process = subprocess.run(['ffmpeg', '-loglevel', 'error', '-f', 'aac', '-i', 'pipe:0', '-f', 'wav', '-'],
+                                 input=bytes(data), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise RuntimeError("Playing AAC tracks needs ffmpeg on your PATH")
+    if process.returncode != 0 or not process.stdout:
+        raise RuntimeError(process.stderr.decode(errors='replace').strip() or "ffmpeg failed")
+    return io.BytesIO(process.stdout)
+
+def open_source(source):
+    if isinstance(source, str):
+        source = map_file(source)
+    if isinstance(source, (bytes, mmap.mmap)) and is_adts(source[:2]):
+        return decode_adts(source)
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    return source
+
+def open_file(path):
+    # open_source without the mapping, for a single pass over the file
+    with open(path, 'rb') as f:
+        if is_adts(f.read(2)):
+            f.seek(0)
+            return decode_adts(f.read())
+    return path
+
+class TrackSource:
+    # One decoded track as seen by the render thread. Positions are in the
+    # track's own frames; render() produces frames at the output rate and
+    # channel count, so tracks with a different format can share one stream.
+    def __init__(self, source, key=None, streaming=True, decoder=None, pcm=None):
+        self.source = source
+        self.key = key
+        self.serial = None
+        self.gain_db = None
+        self.decoder = decoder
+        self.data = None
+
+        if pcm is not None:
+            # Already decoded (PcmCache): frames are read straight from it
+            self.data, self.samplerate = pcm
+            self.frames = len(self.data)
+            self.channels = self.data.shape[1]
+        elif streaming or decoder is not None:
+            if self.decoder is None:
+                self.decoder = StreamingDecoder(open_source(source))
+            self.samplerate = self.decoder.samplerate
+            self.frames = self.decoder.frames
+            self.channels = self.decoder.channels
+        else:
+            self.data, self.samplerate = sf.read(open_source(source), always_2d=True, dtype='float32')
+            self.frames = len(self.data)
+            self.channels = self.data.shape[1]
+
+        self.position = 0.0
+        self._stretching = False
+        self._window = None
+        self._rate_window = None
+
+    def configure(self, out_rate, out_channels, block_frames):
+        self.ratio = self.samplerate / float(out_rate)
+        self.out_channels = out_channels
+        self.resampler = Resampler(self.channels, block_frames)
+        self.rate_resampler = Resampler(self.channels)
+        # The stretcher works in output-rate frames and reads through
+        # read(), which converts the sample rate on the fly.
+        self.stretcher = TimeStretcher(self.channels, out_rate)
+        self.stretcher.length = int(self.frames / self.ratio)
+        self.scratch = np.zeros((block_frames, self.channels), dtype=np.float32)
+
+    def seek(self, position):
+        self.position = max(0.0, min(float(position), float(self.frames)))
+        self._stretching = False
+        if self.decoder:
+            self.decoder.request_seek(int(self.position))
+
+    def remaining(self, speed):
+        rate = max(speed, 1e-3) * self.ratio
+        return max(0.0, (self.frames - self.position) / rate)
+
+    def get_data(self):
+        if self.data is not None:
+            return self.data
+        data, _ = sf.read(open_source(self.source), always_2d=True, dtype='float32')
+        return data
+
+    def close(self):
+        if self.decoder:
+            self.decoder.close()
+            self.decoder = None
+
+    def render(self, block, speed, pitch_correction):
+        if len(self.scratch) < len(block):
+            self.scratch = np.zeros((len(block), self.channels), dtype=np.float32)
+        out = block if self.channels == self.out_channels else self.scratch[:len(block)]
+
+        if int(self.position) > self.frames - 2:
+            return 0, True
+        if pitch_correction and 0.0 < speed != 1.0:
+            n, finished = self._stretch(out, speed)
+        else:
+            self._stretching = False
+            n, finished = self._resample(out, speed * self.ratio)
+
+        if out is not block and n:
+            self._map_channels(out[:n], block[:n])
+        return n, finished
+
+    def read(self, start, out):
+        if self.ratio == 1.0:
+            return self._read_source(start, out)
+
+        offset = start * self.ratio
+        base = int(offset)
+        needed = self.rate_resampler.input_frames(offset, len(out), self.ratio)
+        if self._rate_window is None or len(self._rate_window) < needed:
+            self._rate_window = np.zeros((needed, self.channels), dtype=np.float32)
+        got = self._read_source(base, self._rate_window[:needed])
+        if got < needed and base + got < self.frames:
+            return 0
+        return self.rate_resampler.process(self._rate_window[:got], offset - base, self.ratio, out)
+
+    def _read_source(self, start, out):
+        if self.decoder:
+            return self.decoder.read(start, out)
+        n = max(0, min(len(out), self.frames - start))
+        out[:n] = self.data[start:start + n]
+        return n
+
+    def _stretch(self, out, speed):
+        if not self._stretching:
+            self.stretcher.reset(self.position / self.ratio)
+            self._stretching = True
+
+        n = self.stretcher.process(self.read, speed, out)
+        self.position = min(self.stretcher.position * self.ratio, float(self.frames))
+        return n, n < len(out) and self.stretcher.finished
+
+    def _resample(self, out, rate):
+        if rate == 1.0:
+            # Snap to a whole sample so the resampler can use its copy path
+            self.position = float(round(self.position))
+
+        frames = len(out)
+        if self.decoder:
+            base = int(self.position)
+            needed = self.resampler.input_frames(self.position, frames, rate)
+            if self._window is None or len(self._window) < needed:
+                self._window = np.zeros((needed, self.channels), dtype=np.float32)
+            got = self.decoder.read(base, self._window[:needed])
+            if got < needed and base + got < self.frames:
+                return 0, False
+            data = self._window[:got]
+        else:
+            base = 0
+            data = self.data
+
+        n = self.resampler.process(data, self.position - base, rate, out)
+        if n == 0:
+            return 0, True
+        self.position += n * rate
+        return n, n < frames
+
+    def _map_channels(self, src, dst):
+        if self.channels == 1:
+            dst[:] = src
+        elif dst.shape[1] == 1:
+            np.mean(src, axis=1, out=dst[:, 0])
+        else:
+            common = min(self.channels, dst.shape[1])
+            dst[:, :common] = src[:, :common]
+            dst[:, common:] = 0
@@ -1,5 +1,69 @@
 import requests
 import os
+import threading
+import time
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from .hls import HlsDownloader
+
+# VK allows 3 API requests per second per token
+API_REQUESTS_PER_SECOND = 3
+PAGE_SIZE = 1000
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+class ConnectionStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def count_request(self, response, *args, **kwargs):
+        with self.lock:
+            self.requests += 1
+
+    def count_connection(self):
+        with self.lock:
+            self.connections_opened += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'connections_opened': self.connections_opened,
+                'connections_reused': max(0, self.requests - self.connections_opened)
+            }
+
+class PooledAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+        pool_classes = {}
+        for scheme, base in self.poolmanager.pool_classes_by_scheme.items():
+            class CountingPool(base):
+                def _new_conn(self):
+                    stats.count_connection()
+                    return super()._new_conn()
+            pool_classes[scheme] = CountingPool
+        self.poolmanager.pool_classes_by_scheme = pool_classes
 
 class VKClient:
     def __init__(self, cache_dir="cache"):
@@ -9,9 +73,30 @@ class VKClient:
         self.api_version = "5.131"
         self.user_agent = "VkMeAndroid/56 (Android 4.4.2; SDK 19; x86; unknown Android SDK built for x86; en)"
 
+        self.stats = ConnectionStats()
+        self.session = self._create_session(pool_size=8)
+        self._probe_cache = {}
+        self.rate_limiter = RateLimiter(API_REQUESTS_PER_SECOND)
+        self.hls = HlsDownloader(self.session, headers={"User-Agent": self.user_agent}, workers=8)
+
         if not os.path.exists(cache_dir):
             os.makedirs(cache_dir)
 
+    def _create_session(self, pool_size):
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False)
+        adapter = PooledAdapter(self.stats, pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        
+        session = requests.Session()
+        session.headers["User-Agent"] = self.user_agent
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.hooks['response'].append(self.stats.count_request)
+        return session
+
+    def get_connection_stats(self):
+        return self.stats.snapshot()
+
     def authenticate(self, token):
         self.access_token = token
         try:
@@ -24,85 +109,116 @@ class VKClient:
             print(f"Auth failed: {e}")
             return False
 
-    def get_audio(self, owner_id=None, count=1000):
+    def get_audio(self, owner_id=None, count=None):
+        tracks = []
+        for offset, page in self.iter_audio_pages(owner_id=owner_id):
+            tracks.extend(page)
+            if count and len(tracks) >= count:
+                return tracks[:count]
+        return tracks
+
+    def iter_audio_pages(self, owner_id=None, page_size=PAGE_SIZE, workers=3):
         if not self.access_token:
-            return []
+            return
+        
+        try:
+            total, first_page = self._fetch_audio_page(owner_id, 0, page_size)
+        except Exception as e:
+            print(f"Error fetching audio: {e}")
+            return
         
+        yield 0, first_page
+        
+        offsets = range(page_size, total, page_size)
+        if not offsets:
+            return
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self._fetch_audio_page, owner_id, offset, page_size) for offset in offsets]
+            for offset, future in zip(offsets, futures):
+                try:
+                    yield offset, future.result()[1]
+                except Exception as e:
+                    print(f"Error fetching audio at offset {offset}: {e}")
+
+    def _fetch_audio_page(self, owner_id, offset, page_size, attempts=3):
         params = {
-            "count": count
+            "count": page_size,
+            "offset": offset
         }
         if owner_id:
             params["owner_id"] = owner_id
-            
-        try:
-            data = self._call_api("audio.get", params)
-            
-            if not data:
-                return []
-                
-            items = data.get('items', [])
-            
-            tracks = []
-            for item in items:
-                if 'url' not in item or not item['url']:
-                    continue
-
-                image_url = None
-                if 'album' in item and 'thumb' in item['album']:
-                    album = item['album']
-                    if 'thumb' in album and isinstance(album['thumb'], dict):
-                        max_res = 0
-                        for key, val in album['thumb'].items():
-                            if key.startswith('photo_'):
-                                try:
-                                    res = int(key.split('_')[1])
-                                    if res > max_res:
-                                        max_res = res
-                                        image_url = val
-                                except: pass
-                    else:
-                        max_res = 0
-                        for key, val in album.items():
-                            if key.startswith('photo_'):
-                                try:
-                                    res = int(key.split('_')[1])
-                                    if res > max_res:
-                                        max_res = res
-                                        image_url = val
-                                except: pass
-
-                tracks.append({
-                    'id': item['id'],
-                    'owner_id': item['owner_id'],
-                    'artist': item['artist'],
-                    'title': item['title'],
-                    'url': item['url'],
-                    'duration': item['duration'],
-                    'image_url': image_url
-                })
-            return tracks
-            
-        except Exception as e:
-            print(f"Error fetching audio: {e}")
-            return []
+        
+        for attempt in range(attempts):
+            self.rate_limiter.wait()
+            try:
+                data = self._call_api("audio.get", params)
+                break
+            except Exception:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(1.0 + attempt)
+        
+        if not data:
+            return 0, []
+        
+        tracks = []
+        for item in data.get('items', []):
+            track = self._parse_track(item)
+            if track:
+                tracks.append(track)
+        return data.get('count', 0), tracks
+
+    def _parse_track(self, item):
+        if 'url' not in item or not item['url']:
+            return None
+
+        image_url = None
+        if 'album' in item and 'thumb' in item['album']:
+            album = item['album']
+            if 'thumb' in album and isinstance(album['thumb'], dict):
+                max_res = 0
+                for key, val in album['thumb'].items():
+                    if key.startswith('photo_'):
+                        try:
+                            res = int(key.split('_')[1])
+                            if res > max_res:
+                                max_res = res
+                                image_url = val
+                        except: pass
+            else:
+                max_res = 0
+                for key, val in album.items():
+                    if key.startswith('photo_'):
+                        try:
+                            res = int(key.split('_')[1])
+                            if res > max_res:
+                                max_res = res
+                                image_url = val
+                        except: pass
+
+        return {
+            'id': item['id'],
+            'owner_id': item['owner_id'],
+            'artist': item['artist'],
+            'title': item['title'],
+            'url': item['url'],
+            'duration': item['duration'],
+            'image_url': image_url
+        }
 
     def download_track(self, track_url):
         print(f"Downloading track...")
         
-        mp3_url = track_url
-        if 'index.m3u8' in track_url:
-            test_url = track_url.replace('index.m3u8', 'index.mp3')
-            if self._check_url(test_url):
-                mp3_url = test_url
-                print("Found direct MP3 link.")
+        mp3_url = self._resolve_track_url(track_url)
 
         if 'm3u8' in mp3_url:
-            print("Detected M3U8 playlist. Attempting conversion with FFmpeg...")
-            return self._download_m3u8_ffmpeg_bytes(mp3_url)
+            print("Detected M3U8 playlist. Fetching segments...")
+            return self._download_m3u8_bytes(mp3_url)
         
         try:
             headers = {"User-Agent": self.user_agent}
-            with requests.get(mp3_url, headers=headers, stream=True) as response:
+            with self.session.get(mp3_url, headers=headers, stream=True, timeout=30) as response:
                 if response.status_code != 200:
                     print(f"Download failed: Status {response.status_code}")
                     return None
@@ -119,11 +235,75 @@ class VKClient:
             
         return None
 
+    def download_track_to_file(self, track_url, dest_path, progress=None, chunk_size=64 * 1024):
+        mp3_url = self._resolve_track_url(track_url)
+
+        if 'm3u8' in mp3_url:
+            content = self._download_m3u8_bytes(mp3_url)
+            if not content:
+                return None
+            with open(dest_path, 'wb') as f:
+                f.write(content)
+            if progress:
+                progress(len(content), len(content))
+            return dest_path
+
+        offset = os.path.getsize(dest_path) if os.path.exists(dest_path) else 0
+        headers = {"User-Agent": self.user_agent}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+
+        try:
+            with self.session.get(mp3_url, headers=headers, stream=True, timeout=30) as response:
+                if response.status_code == 416 and offset:
+                    return dest_path
+                if response.status_code == 200:
+                    offset = 0
+                elif response.status_code != 206:
+                    print(f"Download failed: Status {response.status_code}")
+                    return None
+
+                total = response.headers.get('Content-Length')
+                total = int(total) + offset if total else 0
+                done = offset
+
+                with open(dest_path, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if not chunk:
+                            continue
+                        if done == 0 and chunk.startswith(b'#EXTM3U'):
+                            print("Error: Downloaded file is an M3U8 playlist, not audio.")
+                            f.close()
+                            os.remove(dest_path)
+                            return None
+                        f.write(chunk)
+                        done += len(chunk)
+                        if progress:
+                            progress(done, total)
+
+                if total and done < total:
+                    print(f"Download interrupted at {done}/{total} bytes")
+                    return None
+                return dest_path
+
+        except Exception as e:
+            print(f"Download failed with error: {e}")
+
+        return None
+
+    def _resolve_track_url(self, track_url):
+        if 'index.m3u8' in track_url:
+            test_url = track_url.replace('index.m3u8', 'index.mp3')
+            if self._check_url(test_url):
+                print("Found direct MP3 link.")
+                return test_url
+        return track_url
+
     def download_image(self, url):
         if not url:
             return None
         try:
-            response = requests.get(url, headers={"User-Agent": self.user_agent})
+            response = self.session.get(url, timeout=30)
             if response.status_code == 200:
                 return response.content
         except:
@@ -131,19 +311,48 @@ class VKClient:
         return None
 
     def _check_url(self, url):
+        parts = urlsplit(url)
+        key = (parts.netloc, parts.path)
+        cached = self._probe_cache.get(key)
+        if cached is not None:
+            return cached
         try:
-            r = requests.head(url, headers={"User-Agent": self.user_agent})
-            return r.status_code == 200
+            r = self.session.head(url, timeout=10)
+            result = r.status_code == 200
         except:
             return False
+        self._probe_cache[key] = result
+        return result
+
+    def _download_m3u8_bytes(self, url):
+        try:
+            audio, ts = self.hls.download(url)
+            if audio:
+                return audio
+            if ts:
+                print("HLS stream is not MPEG or ADTS audio. Remuxing with FFmpeg...")
+                audio = self._download_m3u8_ffmpeg_bytes(url, input_data=ts)
+                if audio:
+                    return audio
+        except Exception as e:
+            print(f"HLS download failed: {e}")
+
+        print("Attempting conversion with FFmpeg...")
+        return self._download_m3u8_ffmpeg_bytes(url)
 
-    def _download_m3u8_ffmpeg_bytes(self, url):
+    def _download_m3u8_ffmpeg_bytes(self, url, input_data=None):
         import subprocess
         try:
-            cmd = ['ffmpeg', '-i', url, '-vn', '-c:a', 'libmp3lame', '-q:a', '2', '-f', 'mp3', '-']
-            
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
-            out, err = process.communicate()
+            if input_data:
+                # The AAC stream is copied as is; only the URL fallback,
+                # whatever its codec, is re-encoded to MP3
+                cmd = ['ffmpeg', '-f', 'mpegts', '-i', 'pipe:0', '-vn', '-c:a', 'copy', '-f', 'adts', '-']
+            else:
+                cmd = ['ffmpeg', '-i', url, '-vn', '-c:a', 'libmp3lame', '-q:a', '2', '-f', 'mp3', '-']
+
+            process = subprocess.Popen(cmd, stdin=subprocess.PIPE if input_data else None,
+                                       stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            out, err = process.communicate(input_data)
             
             if process.returncode == 0 and out:
                 return out
@@ -165,7 +374,7 @@ class VKClient:
             "Accept-Encoding": "gzip, deflate"
         }
         
-        response = requests.get(url, params=params, headers=headers)
+        response = self.session.get(url, params=params, headers=headers, timeout=30)
         response.raise_for_status()
         
         data = response.json()
@@ -0,0 +1,98 @@
+import numpy as np
+import soundfile as sf
+from .track_source import open_source
+
+MAGIC = b"PKS1"
+BASE_FRAMES = 256
+FACTOR = 4
+MIN_BINS = 16
+
+class PeakPyramid:
+    # Min/max envelope of a track as int8 pairs. Level 0 covers BASE_FRAMES
+    # source frames per bin; every further level merges FACTOR bins of the
+    # one below, so any zoom is drawn from at most FACTOR bins per column.
+    def __init__(self, samplerate, frames, levels, base=BASE_FRAMES, factor=FACTOR):
+        self.samplerate = samplerate
+        self.frames = frames
+        self.levels = levels
+        self.base = base
+        self.factor = factor
+
+    @classmethod
+    def from_envelope(cls, samplerate, frames, lows, highs, base=BASE_FRAMES, factor=FACTOR):
+        # Round outwards so quantization never hides a peak
+        level = np.empty((len(lows), 2), dtype=np.int8)
+        level[:, 0] = np.clip(np.floor(lows * 127.0), -127, 127)
+        level[:, 1] = np.clip(np.ceil(highs * 127.0), -127, 127)
+        levels = [level]
+        while len(levels[-1]) > MIN_BINS:
+            prev = levels[-1]
+            starts = np.arange(0, len(prev), factor)
+            merged = np.empty((len(starts), 2), dtype=np.int8)
+            merged[:, 0] = np.minimum.reduceat(prev[:, 0], starts)
+            merged[:, 1] = np.maximum.reduceat(prev[:, 1], starts)
+            levels.append(merged)
+        return cls(samplerate, frames, levels, base, factor)
+
+    def to_bytes(self):
+        header = np.array([self.samplerate, self.frames, self.base, self.factor, len(self.levels)], dtype='<u8')
+        return MAGIC + header.tobytes() + b"".join(level.tobytes() for level in self.levels)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data or data[:4] != MAGIC:
+            return None
+        samplerate, frames, base, factor, count = (int(v) for v in np.frombuffer(data, dtype='<u8', count=5, offset=4))
+        levels = []
+        offset = 4 + 5 * 8
+        bins = -(-frames // base)
+        for _ in range(count):
+            levels.append(np.frombuffer(data, dtype=np.int8, count=bins * 2, offset=offset).reshape(bins, 2))
+            offset += bins * 2
+            bins = -(-bins // factor)
+        return cls(samplerate, frames, levels, base, factor)
+
+    def columns(self, width, start=0.0, end=1.0):
+        # (lows, highs) in -1..1 for `width` columns spanning start..end of
+        # the track, or None when the range holds no audio.
+        span_frames = (end - start) * self.frames
+        if width <= 0 or span_frames <= 0:
+            return None
+        frames_per_bin = self.base
+        level = self.levels[0]
+        for candidate in self.levels[1:]:
+            if span_frames / (frames_per_bin * self.factor) < width:
+                break
+            frames_per_bin *= self.factor
+            level = candidate
+
+        edges = (start * self.frames + np.arange(width + 1) * (span_frames / width)) / frames_per_bin
+        first = np.clip(np.floor(edges[:-1]).astype(np.int64), 0, len(level) - 1)
+        end_bin = max(int(np.ceil(edges[-1])), first[-1] + 1)
+        # reduceat reduces each column up to the next column's first bin and
+        # repeats the bin for columns narrower than one bin.
+        level = level[:end_bin]
+        lows = np.minimum.reduceat(level[:, 0], first)
+        highs = np.maximum.reduceat(level[:, 1], first)
+        return lows / 127.0, highs / 127.0
+
+def compute_peaks(source, block_frames=BASE_FRAMES * 1024):
+    # Streams the file, so memory is bounded by one block whatever the length
+    with sf.SoundFile(open_source(source)) as f:
+        lows, highs = [], []
+        frames = 0
+        for block in f.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+            if len(block) == 0:
+                break
+            frames += len(block)
+            # Whole bins as rows of a contiguous view, then the partial tail
+            full = len(block) // BASE_FRAMES * BASE_FRAMES
+            bins = block[:full].reshape(-1, BASE_FRAMES * block.shape[1])
+            lows.append(bins.min(axis=1))
+            highs.append(bins.max(axis=1))
+            if full < len(block):
+                lows.append(block[full:].min(keepdims=True).ravel())
+                highs.append(block[full:].max(keepdims=True).ravel())
+        if not lows:
+            return None
+        return PeakPyramid.from_envelope(f.samplerate, frames, np.concatenate(lows), np.concatenate(highs))
@@ -0,0 +1,61 @@
+import os
+import shutil
+import subprocess
+import sys
+import pytest
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.hls import HlsDownloader
+from core.track_source import is_adts, open_source
+from core.vk_client import VKClient
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+
+class Response:
+    def __init__(self, content):
+        self.content = content
+        self.text = content.decode(errors='replace')
+
+    def raise_for_status(self):
+        pass
+
+class Session:
+    def __init__(self, files):
+        self.files = files
+
+    def get(self, url, **kwargs):
+        return Response(self.files[url])
+
+def ffmpeg(*args):
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', *args], check=True)
+
+@pytest.fixture
+def aac_stream(tmp_path):
+    # Two seconds of AAC in a transport stream, as an HLS playlist
+    aac, ts = str(tmp_path / "tone.aac"), str(tmp_path / "tone.ts")
+    ffmpeg('-f', 'lavfi', '-i', 'sine=frequency=440:duration=2', '-ac', '2', '-c:a', 'aac', '-f', 'adts', aac)
+    ffmpeg('-i', aac, '-c:a', 'copy', '-f', 'mpegts', ts)
+    with open(aac, 'rb') as f:
+        adts = f.read()
+    with open(ts, 'rb') as f:
+        segment = f.read()
+    playlist = b"#EXTM3U\n#EXT-X-TARGETDURATION:2\n#EXTINF:2.0,\nseg0.ts\n#EXT-X-ENDLIST\n"
+    files = {"https://example.com/index.m3u8": playlist, "https://example.com/seg0.ts": segment}
+    return adts, files
+
+def test_aac_stream_is_copied_not_reencoded(aac_stream, tmp_path):
+    adts, files = aac_stream
+    client = VKClient(cache_dir=str(tmp_path / "cache"))
+    client.hls = HlsDownloader(Session(files))
+    audio = client._download_m3u8_bytes("https://example.com/index.m3u8")
+    assert audio == adts
+
+def test_adts_tracks_decode(aac_stream):
+    adts, _ = aac_stream
+    assert is_adts(adts)
+    assert not is_adts(b"\xff\xfb\x90\x00")
+    with sf.SoundFile(open_source(adts)) as f:
+        assert f.samplerate == 44100
+        assert f.channels == 2
+        assert 2 * 44100 <= f.frames < 2.1 * 44100
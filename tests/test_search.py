@@ -0,0 +1,53 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.database import Database
+from core.search import fold, match_query
+
+TRACKS = [
+    ("Beats", "Nights"),
+    ("Ёлка", "Прованс"),
+    ("foo_bar", "Snake_case Song"),
+    ("AC/DC", "Back in Black"),
+    ("Guns N' Roses", "Don't Cry"),
+]
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "test.db"), str(tmp_path / "blobs"))
+    db.save_tracks([{'id': str(i), 'artist': artist, 'title': title, 'url': ""}
+                    for i, (artist, title) in enumerate(TRACKS)])
+    yield db
+    db.close()
+
+def test_fold_splits_like_the_index_tokenizer():
+    assert fold("foo_bar") == "foo bar"
+    assert match_query("foo_bar") == match_query("foo bar")
+
+@pytest.mark.parametrize("query, expected", [
+    ("foo_bar", ["2"]),
+    ("snake_", ["2"]),
+    ("_", None),
+    ("__init__", []),
+    ("ac/dc", ["3"]),
+    ("AC-DC back", ["3"]),
+    ("don't", ["4"]),
+    ("guns n' ro", ["4"]),
+    ("'\"*()", None),
+    ("back\"in", ["3"]),
+    ("beat", ["0"]),
+    ("Yolka", ["1"]),
+])
+def test_punctuation_and_underscore_queries(db, query, expected):
+    assert db.search_tracks(query) == expected
+
+def test_fallback_without_fts_matches_the_same(db):
+    db.search_enabled = False
+    assert db.search_tracks("foo_bar") == ["2"]
+    assert db.search_tracks("ac/dc") == ["3"]
+
+def test_bad_expression_returns_no_results(db, monkeypatch):
+    monkeypatch.setattr("core.database.match_query", lambda text: '"a" NEAR(')
+    assert db.search_tracks("a") == []
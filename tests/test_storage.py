@@ -0,0 +1,78 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.database import Database
+from core.pcm_cache import PcmCache
+from core.storage import StorageManager
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "test.db"), str(tmp_path / "blobs"))
+    db.save_tracks([{'id': str(i), 'artist': "Artist", 'title': f"Track {i}", 'url': ""} for i in range(40)])
+    for i in range(40):
+        db.save_track_audio(str(i), f"audio {i}".encode())
+    yield db
+    db.close()
+
+def evict(db, track_ids):
+    for track_id in track_ids:
+        path = db.get_track_audio_path(track_id)
+        db.evict_audio(os.path.basename(path))
+
+def test_loudness_queue_skips_evicted_audio(db):
+    evict(db, [str(i) for i in range(20)])
+    assert db.count_tracks_without_loudness() == 20
+    pending = db.get_tracks_without_loudness(16)
+    assert len(pending) == 16
+    assert all(os.path.exists(path) for _, path in pending)
+
+def test_eviction_keeps_more_ids_than_bound_parameters(db):
+    db.save_tracks([{'id': f"extra{i}", 'artist': "", 'title': "", 'url': ""} for i in range(db.MAX_PARAMS)])
+    keep = [f"extra{i}" for i in range(db.MAX_PARAMS)] + ["39"]
+    candidates = db.get_eviction_candidates(keep, limit=100)
+    kept = os.path.basename(db.get_track_audio_path("39"))
+    assert len(candidates) == 39
+    assert kept not in [digest for digest, _ in candidates]
+    assert len(db.get_eviction_candidates(limit=100)) == 40
+
+def test_deleting_the_last_stored_copy_removes_the_blob(db):
+    db.save_tracks([{'id': "copy", 'artist': "", 'title': "", 'url': ""}])
+    db.save_track_audio("copy", b"audio 0")
+    path = db.get_track_audio_path("0")
+    digest = os.path.basename(path)
+    db.save_track_peaks("0", b"peaks")
+    # "copy" was evicted earlier: it keeps the hash but not the file
+    db._connect().execute("UPDATE tracks SET audio_path=NULL, audio_size=NULL WHERE id='copy'")
+    db._connect().commit()
+    db.mark_track_deleted("0")
+    assert not os.path.exists(path)
+    # The evicted row still gets its peaks when the audio comes back
+    assert db.has_track_peaks("copy")
+    db.mark_track_deleted("copy")
+    assert db._connect().execute("SELECT 1 FROM peaks WHERE hash=?", (digest,)).fetchone() is None
+
+def test_decoded_audio_counts_against_the_budget(db, tmp_path):
+    pcm = PcmCache(str(tmp_path / "pcm"))
+    for i in range(3):
+        path = pcm.path_for(f"track{i}")
+        with open(path, 'wb') as f:
+            f.write(bytes(60))
+        os.utime(path, (i, i))
+    audio = db.get_storage_usage()
+    storage = StorageManager(db, budget_bytes=audio, pcm_cache=pcm)
+    assert pcm.disk_bytes == audio // 4
+    storage.enforce()
+    # The newest decoded track fits its share; audio made room for it
+    assert os.listdir(pcm.directory) == ["track2.pcm"]
+    assert storage.evicted > 0
+    assert storage.usage_bytes <= audio
+    assert storage.usage_bytes == db.get_storage_usage() + 60
+
+def test_no_budget_keeps_the_cache_limit(db, tmp_path):
+    pcm = PcmCache(str(tmp_path / "pcm"), disk_bytes=1000)
+    storage = StorageManager(db, budget_bytes=400, pcm_cache=pcm)
+    assert pcm.disk_bytes == 100
+    storage.set_budget(0)
+    assert pcm.disk_bytes == 1000
@@ -1,17 +1,38 @@
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QSlider, QLabel, QGroupBox
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QSlider, QLabel, QGroupBox, QCheckBox,
+                               QComboBox, QPushButton, QInputDialog)
 from PySide6.QtCore import Qt, Signal
+from .spectrum_view import SpectrumView
 
 class EffectsPanel(QWidget):
     eq_changed = Signal(int, float)
     speed_changed = Signal(float)
+    pitch_correction_changed = Signal(bool)
+    crossfade_changed = Signal(float)
+    normalize_changed = Signal(bool)
+    preset_selected = Signal(str)
+    preset_saved = Signal(str)
+    preset_deleted = Signal(str)
 
     def __init__(self):
         super().__init__()
         self.layout = QHBoxLayout(self)
         
         self.eq_group = QGroupBox("Equalizer (10 Band)")
+        self.eq_group_layout = QVBoxLayout()
         self.eq_layout = QHBoxLayout()
         self.eq_sliders = []
+
+        self.preset_layout = QHBoxLayout()
+        self.preset_combo = QComboBox()
+        self.preset_combo.setPlaceholderText("Preset")
+        self.preset_combo.activated.connect(self.on_preset)
+        self.preset_save_btn = QPushButton("Save")
+        self.preset_save_btn.clicked.connect(self.on_save_preset)
+        self.preset_delete_btn = QPushButton("Delete")
+        self.preset_delete_btn.clicked.connect(self.on_delete_preset)
+        self.preset_layout.addWidget(self.preset_combo, stretch=1)
+        self.preset_layout.addWidget(self.preset_save_btn)
+        self.preset_layout.addWidget(self.preset_delete_btn)
         
         bands = ["32", "64", "125", "250", "500", "1k", "2k", "4k", "8k", "16k"]
 
@@ -34,7 +55,11 @@ class EffectsPanel(QWidget):
             self.eq_layout.addLayout(v_layout)
             self.eq_sliders.append(slider)
             
-        self.eq_group.setLayout(self.eq_layout)
+        self.spectrum = SpectrumView()
+        self.eq_group_layout.addLayout(self.preset_layout)
+        self.eq_group_layout.addWidget(self.spectrum)
+        self.eq_group_layout.addLayout(self.eq_layout)
+        self.eq_group.setLayout(self.eq_group_layout)
         
         self.dyn_group = QGroupBox("Dynamics & Speed")
         self.dyn_layout = QVBoxLayout()
@@ -49,6 +74,26 @@ class EffectsPanel(QWidget):
         self.speed_layout.addWidget(self.speed_slider)
         
         self.dyn_layout.addLayout(self.speed_layout)
+
+        self.pitch_checkbox = QCheckBox("Keep pitch")
+        self.pitch_checkbox.setChecked(True)
+        self.pitch_checkbox.toggled.connect(self.pitch_correction_changed.emit)
+        self.dyn_layout.addWidget(self.pitch_checkbox)
+        
+        self.normalize_checkbox = QCheckBox("Normalize loudness")
+        self.normalize_checkbox.setChecked(True)
+        self.normalize_checkbox.toggled.connect(self.normalize_changed.emit)
+        self.dyn_layout.addWidget(self.normalize_checkbox)
+        
+        self.crossfade_layout = QHBoxLayout()
+        self.crossfade_label = QLabel("Crossfade: off")
+        self.crossfade_slider = QSlider(Qt.Horizontal)
+        self.crossfade_slider.setRange(0, 100)
+        self.crossfade_slider.setValue(0)
+        self.crossfade_slider.valueChanged.connect(self.on_crossfade)
+        self.crossfade_layout.addWidget(self.crossfade_label)
+        self.crossfade_layout.addWidget(self.crossfade_slider)
+        self.dyn_layout.addLayout(self.crossfade_layout)
         self.dyn_group.setLayout(self.dyn_layout)
         
         self.layout.addWidget(self.eq_group, stretch=2)
@@ -58,3 +103,45 @@ class EffectsPanel(QWidget):
         val = self.speed_slider.value() / 100.0
         self.speed_label.setText(f"Speed: {val:.2f}x")
         self.speed_changed.emit(val)
+
+    def on_crossfade(self):
+        val = self.crossfade_slider.value() / 10.0
+        self.crossfade_label.setText(f"Crossfade: {val:.1f}s" if val else "Crossfade: off")
+        self.crossfade_changed.emit(val)
+
+    def set_crossfade(self, seconds):
+        self.crossfade_slider.blockSignals(True)
+        self.crossfade_slider.setValue(int(round(seconds * 10)))
+        self.crossfade_slider.blockSignals(False)
+        self.crossfade_label.setText(f"Crossfade: {seconds:.1f}s" if seconds else "Crossfade: off")
+
+    def set_normalize(self, enabled):
+        self.normalize_checkbox.blockSignals(True)
+        self.normalize_checkbox.setChecked(enabled)
+        self.normalize_checkbox.blockSignals(False)
+
+    def set_gains(self, gains):
+        for slider, gain in zip(self.eq_sliders, gains):
+            slider.blockSignals(True)
+            slider.setValue(int(round(gain)))
+            slider.blockSignals(False)
+
+    def set_presets(self, names, current=None):
+        self.preset_combo.blockSignals(True)
+        self.preset_combo.clear()
+        self.preset_combo.addItems(names)
+        self.preset_combo.setCurrentIndex(names.index(current) if current in names else -1)
+        self.preset_combo.blockSignals(False)
+
+    def on_preset(self, index):
+        self.preset_selected.emit(self.preset_combo.itemText(index))
+
+    def on_save_preset(self):
+        name, ok = QInputDialog.getText(self, "Save Preset", "Preset name:",
+                                        text=self.preset_combo.currentText())
+        if ok and name.strip():
+            self.preset_saved.emit(name.strip())
+
+    def on_delete_preset(self):
+        if self.preset_combo.currentIndex() >= 0:
+            self.preset_deleted.emit(self.preset_combo.currentText())
@@ -1,18 +1,46 @@
 import sys
 import os
+import json
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QHBoxLayout, QListWidget, QLineEdit, QPushButton, 
-                             QMessageBox, QLabel, QMenu, QListWidgetItem)
-from PySide6.QtGui import QPixmap, QIcon, QPainter, QBrush, QColor, QPainterPath
-from PySide6.QtCore import QTimer, Qt, QSize
+                             QHBoxLayout, QListView, QLineEdit, QPushButton, 
+                             QMessageBox, QLabel, QMenu, QAbstractItemView, QSpinBox, QCheckBox)
+from PySide6.QtCore import QTimer, Qt, QSize, QObject, Signal
 
 from core.audio_engine import AudioEngine
 from core.vk_client import VKClient
 from core.database import Database
-from core.exporter import Exporter
+from core.exporter import Exporter, effect_settings
+from core.download_manager import DownloadManager
+from core.loudness import LoudnessAnalyzer, normalization_gain
+from core.effects import EQ_PRESETS
+from core.spectrum import SpectrumAnalyzer
+from core.storage import StorageManager
+from core.prefetch import Prefetcher
+from core.pcm_cache import PcmCache
 from .styles import DARK_THEME
 from .player_controls import PlayerControls
 from .effects_panel import EffectsPanel
+from .playlist_model import PlaylistModel
+from .thumbnail_cache import ThumbnailCache
+from .tasks import TaskRunner, StallWatchdog
+
+class DownloadSignals(QObject):
+    progress = Signal(str, int, int)
+    finished = Signal(str)
+    failed = Signal(str)
+
+class ExportSignals(QObject):
+    progress = Signal(str, float)
+    finished = Signal(str, str)
+    done = Signal(int, int)
+
+class AnalysisSignals(QObject):
+    progress = Signal(int, int)
+    analyzed = Signal(str, float, float)
+
+class SyncSignals(QObject):
+    page = Signal(list)
+    finished = Signal(int)
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -24,7 +52,50 @@ class MainWindow(QMainWindow):
         self.audio_engine = AudioEngine()
         self.vk_client = VKClient()
         self.exporter = Exporter()
-        self.tracks = []
+        self.thumbnails = ThumbnailCache(self.db)
+        self.playlist_model = PlaylistModel(self.thumbnails)
+        self.pending_track_id = None
+        self.current_track_id = None
+        self.queued_track_id = None
+        self.tasks = TaskRunner()
+        self.watchdog = StallWatchdog()
+        self.export_batch = None
+        self.export_progress = {}
+        
+        self.export_signals = ExportSignals()
+        self.export_signals.progress.connect(self.on_export_progress)
+        self.export_signals.finished.connect(self.on_export_finished)
+        self.export_signals.done.connect(self.on_export_done)
+        
+        self.sync_signals = SyncSignals()
+        self.sync_signals.page.connect(self.on_sync_page)
+        self.sync_signals.finished.connect(self.on_sync_finished)
+        
+        self.pcm_cache = PcmCache()
+        self.storage = StorageManager(self.db, keep=self.storage_keep_ids, pcm_cache=self.pcm_cache)
+        
+        self.download_signals = DownloadSignals()
+        self.download_signals.progress.connect(self.on_download_progress)
+        self.download_signals.finished.connect(self.on_download_finished)
+        self.download_signals.failed.connect(self.on_download_failed)
+        self.downloads = DownloadManager(
+            self.vk_client, self.db,
+            on_progress=self.download_signals.progress.emit,
+            on_finished=self.download_signals.finished.emit,
+            on_failed=self.download_signals.failed.emit,
+            store_cover=self.thumbnails.store,
+            has_room=self.storage.has_room
+        )
+        self.prefetch = Prefetcher(self.downloads, self.db)
+        
+        self.analysis_signals = AnalysisSignals()
+        self.analysis_signals.progress.connect(self.on_analysis_progress)
+        self.analysis_signals.analyzed.connect(self.on_track_analyzed)
+        self.loudness = LoudnessAnalyzer(
+            self.db,
+            on_progress=self.analysis_signals.progress.emit,
+            on_analyzed=self.analysis_signals.analyzed.emit
+        )
         
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -35,14 +106,41 @@ class MainWindow(QMainWindow):
         self.token_input.setPlaceholderText("Enter VK Access Token or User Link (requires token for API)")
         self.auth_btn = QPushButton("Load Tracks")
         self.auth_btn.clicked.connect(self.authenticate)
+        self.cache_btn = QPushButton("Cache Library")
+        self.cache_btn.clicked.connect(self.cache_library)
+        
+        self.storage_label = QLabel("")
+        self.budget_spin = QSpinBox()
+        self.budget_spin.setRange(0, 1000)
+        self.budget_spin.setSuffix(" GB")
+        self.budget_spin.setSpecialValueText("No limit")
+        self.budget_spin.setToolTip("Disk budget for cached audio, Fast Replay included")
+        self.budget_spin.valueChanged.connect(self.update_storage_budget)
+        self.pcm_check = QCheckBox("Fast Replay")
+        self.pcm_check.setToolTip("Keep decoded audio of recently played tracks so replaying and seeking them is instant")
+        self.pcm_check.toggled.connect(self.update_pcm_cache)
         
         self.auth_layout.addWidget(self.token_input)
         self.auth_layout.addWidget(self.auth_btn)
+        self.auth_layout.addWidget(self.cache_btn)
+        self.auth_layout.addWidget(self.storage_label)
+        self.auth_layout.addWidget(self.budget_spin)
+        self.auth_layout.addWidget(self.pcm_check)
         
         self.content_layout = QHBoxLayout()
         
-        self.playlist = QListWidget()
-        self.playlist.itemDoubleClicked.connect(self.play_track)
+        self.playlist_layout = QVBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search artist or title")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.textChanged.connect(self.search_tracks)
+        
+        self.playlist = QListView()
+        self.playlist.setModel(self.playlist_model)
+        self.playlist.setUniformItemSizes(True)
+        self.playlist.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.playlist.setIconSize(QSize(48, 48))
+        self.playlist.doubleClicked.connect(self.play_track)
         self.playlist.setContextMenuPolicy(Qt.CustomContextMenu)
         self.playlist.customContextMenuRequested.connect(self.show_playlist_context_menu)
         
@@ -58,21 +156,28 @@ class MainWindow(QMainWindow):
         self.info_label.setStyleSheet("font-size: 18px; color: #888; font-weight: bold;")
         self.info_label.setWordWrap(True)
         
-        self.export_btn = QPushButton("Export Processed Track")
-        self.export_btn.clicked.connect(self.export_current_track)
-        self.export_btn.setEnabled(False)
+        self.export_btn = QPushButton("Export Selected")
+        self.export_btn.clicked.connect(self.export_selected_tracks)
         
         self.info_layout.addWidget(self.art_label, alignment=Qt.AlignCenter)
         self.info_layout.addWidget(self.info_label)
         self.info_layout.addWidget(self.export_btn)
         self.info_layout.addStretch()
         
-        self.content_layout.addWidget(self.playlist, stretch=1)
+        self.playlist_layout.addWidget(self.search_input)
+        self.playlist_layout.addWidget(self.playlist)
+        self.content_layout.addLayout(self.playlist_layout, stretch=1)
         self.content_layout.addLayout(self.info_layout, stretch=1)
         
         self.effects_panel = EffectsPanel()
         self.effects_panel.eq_changed.connect(self.update_eq)
         self.effects_panel.speed_changed.connect(self.update_speed)
+        self.effects_panel.pitch_correction_changed.connect(self.update_pitch_correction)
+        self.effects_panel.crossfade_changed.connect(self.update_crossfade)
+        self.effects_panel.normalize_changed.connect(self.update_normalize)
+        self.effects_panel.preset_selected.connect(self.apply_eq_preset)
+        self.effects_panel.preset_saved.connect(self.save_eq_preset)
+        self.effects_panel.preset_deleted.connect(self.delete_eq_preset)
 
         self.controls = PlayerControls()
         self.controls.play_clicked.connect(self.audio_engine.play)
@@ -89,230 +194,513 @@ class MainWindow(QMainWindow):
         self.timer.timeout.connect(self.update_ui)
         self.timer.start(100)
         
+        self.spectrum = SpectrumAnalyzer(self.audio_engine)
+        self.spectrum_frame = 0
+        self.spectrum_timer = QTimer()
+        self.spectrum_timer.timeout.connect(self.update_spectrum)
+        self.spectrum_timer.start(1000 // self.spectrum.fps)
+        self.spectrum.start()
+        
         self.setStyleSheet(DARK_THEME)
         
         self.load_state()
+        self.watchdog.start()
 
     def load_state(self):
         token = self.db.get_setting("access_token")
         if token:
             self.token_input.setText(token)
             self.vk_client.access_token = token
+        
+        crossfade = float(self.db.get_setting("crossfade", 0.0))
+        self.audio_engine.set_crossfade(crossfade)
+        self.effects_panel.set_crossfade(crossfade)
+        
+        normalize = self.db.get_setting("normalize", "1") == "1"
+        self.audio_engine.normalize = normalize
+        self.effects_panel.set_normalize(normalize)
+
+        try:
+            gains = json.loads(self.db.get_setting("eq_gains", "[]"))
+        except ValueError:
+            gains = []
+        self.audio_engine.eq.set_gains(gains, immediate=True)
+        self.effects_panel.set_gains(self.audio_engine.eq.gains)
+        self.refresh_eq_presets(self.db.get_setting("eq_preset"))
+            
+        budget_gb = int(self.db.get_setting("storage_budget_gb", 0))
+        self.budget_spin.blockSignals(True)
+        self.budget_spin.setValue(budget_gb)
+        self.budget_spin.blockSignals(False)
+        self.storage.set_budget(budget_gb * 2**30)
+        
+        fast_replay = self.db.get_setting("fast_replay", "1") == "1"
+        self.pcm_check.blockSignals(True)
+        self.pcm_check.setChecked(fast_replay)
+        self.pcm_check.blockSignals(False)
+        self.audio_engine.pcm_cache = self.pcm_cache if fast_replay else None
             
-        saved_tracks = self.db.get_tracks()
-        if saved_tracks:
-            self.tracks = saved_tracks
-            self.refresh_playlist()
+        self.playlist_model.set_tracks(self.db.get_tracks())
+        self.loudness.start()
+        self.storage.start()
 
     def authenticate(self):
         token = self.token_input.text().strip()
         if not token:
             QMessageBox.warning(self, "Error", "Please enter a token")
             return
-            
-        if self.vk_client.authenticate(token):
+        if self.tasks.is_running("auth") or self.tasks.is_running("sync"):
+            return
+        
+        self.auth_btn.setEnabled(False)
+        self.auth_btn.setText("Connecting...")
+        self.tasks.submit(self.vk_client.authenticate, token, group="auth",
+                          on_done=lambda ok: self.on_authenticated(token, ok),
+                          on_error=lambda message: self.on_authenticated(token, False))
+
+    def on_authenticated(self, token, ok):
+        self.auth_btn.setEnabled(True)
+        self.auth_btn.setText("Load Tracks")
+        if ok:
             self.db.set_setting("access_token", token)
             self.load_tracks_from_api()
         else:
             QMessageBox.critical(self, "Error", "Authentication failed")
 
     def load_tracks_from_api(self):
-        new_tracks = self.vk_client.get_audio()
-        if new_tracks:
-            filtered_tracks = []
-            for t in new_tracks:
-                if not self.db.is_track_deleted(t['id']):
-                    filtered_tracks.append(t)
-            
-            self.tracks = filtered_tracks
-            self.db.save_tracks(self.tracks)
-            self.refresh_playlist()
-        else:
-            QMessageBox.information(self, "Info", "No tracks found or access denied")
-
-    def get_rounded_pixmap(self, pixmap, size=48, radius=24):
-        scaled = pixmap.scaled(size, size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
-        
-        if scaled.width() > size or scaled.height() > size:
-            x = (scaled.width() - size) // 2
-            y = (scaled.height() - size) // 2
-            scaled = scaled.copy(x, y, size, size)
-            
-        rounded = QPixmap(size, size)
-        rounded.fill(Qt.transparent)
-        
-        painter = QPainter(rounded)
-        painter.setRenderHint(QPainter.Antialiasing)
-        
-        path = QPainterPath()
-        path.addRoundedRect(0, 0, size, size, radius, radius)
-        
-        painter.setClipPath(path)
-        painter.drawPixmap(0, 0, scaled)
-        painter.end()
+        if self.tasks.is_running("sync"):
+            return
         
-        return rounded
+        self.auth_btn.setEnabled(False)
+        self.auth_btn.setText("Syncing...")
+        self.tasks.submit(self._sync_library, group="sync")
 
-    def get_placeholder_pixmap(self, size=48):
-        pixmap = QPixmap(size, size)
-        pixmap.fill(Qt.transparent)
-        
-        painter = QPainter(pixmap)
-        painter.setRenderHint(QPainter.Antialiasing)
-        
-        painter.setBrush(QBrush(QColor("#444")))
-        painter.setPen(Qt.NoPen)
-        painter.drawEllipse(0, 0, size, size)
-        
-        painter.setPen(QColor("#888"))
-        painter.setBrush(Qt.NoBrush)
-        font = painter.font()
-        font.setPixelSize(int(size * 0.6))
-        painter.setFont(font)
-        painter.drawText(0, 0, size, size, Qt.AlignCenter, "♪")
-        
-        painter.end()
-        return pixmap
+    def _sync_library(self):
+        total = 0
+        try:
+            for offset, page in self.vk_client.iter_audio_pages():
+                kept, added, changed = self.db.sync_tracks(page)
+                total += len(kept)
+                self.sync_signals.page.emit(kept)
+        except Exception as e:
+            print(f"Library sync failed: {e}")
+        self.sync_signals.finished.emit(total)
 
-    def refresh_playlist(self):
-        self.playlist.clear()
-        self.playlist.setIconSize(QSize(48, 48))
-        
-        for track in self.tracks:
-            title = f"{track['artist']} - {track['title']}"
-            item = QListWidgetItem(title)
-            
-            image_data = self.db.get_track_image(track['id'])
-            if image_data:
-                pixmap = QPixmap()
-                pixmap.loadFromData(image_data)
-                icon_pixmap = self.get_rounded_pixmap(pixmap)
-                item.setIcon(QIcon(icon_pixmap))
-            else:
-                item.setIcon(QIcon(self.get_placeholder_pixmap()))
-                
-            self.playlist.addItem(item)
+    def on_sync_page(self, tracks):
+        self.playlist_model.merge_tracks(tracks)
+
+    def on_sync_finished(self, total):
+        self.auth_btn.setEnabled(True)
+        self.auth_btn.setText("Load Tracks")
+        if total == 0:
+            QMessageBox.information(self, "Info", "No tracks found or access denied")
+        elif self.search_input.text().strip():
+            self.search_tracks(self.search_input.text())
+
+    def search_tracks(self, text):
+        self.playlist_model.set_filter(self.db.search_tracks(text))
+
+    def selected_row(self):
+        indexes = self.playlist.selectionModel().selectedIndexes()
+        return indexes[0].row() if indexes else -1
 
     def show_playlist_context_menu(self, position):
         menu = QMenu()
         delete_action = menu.addAction("Delete")
+        export_action = menu.addAction("Export Selected")
+        export_all_action = menu.addAction("Export All")
+        menu.addSeparator()
+        selected = self.selected_tracks()
+        pin_action = menu.addAction("Keep Offline")
+        pin_action.setCheckable(True)
+        pin_action.setChecked(bool(selected) and all(self.db.is_track_pinned(t['id']) for t in selected))
+        pin_action.setEnabled(bool(selected))
         action = menu.exec(self.playlist.mapToGlobal(position))
-        if action == delete_action:
+        if action == pin_action:
+            for track in selected:
+                self.db.set_track_pinned(track['id'], pin_action.isChecked())
+        elif action == delete_action:
             self.delete_selected_track()
+        elif action == export_action:
+            self.export_selected_tracks()
+        elif action == export_all_action:
+            self.export_all_tracks()
 
     def delete_selected_track(self):
-        items = self.playlist.selectedItems()
-        if not items:
+        row = self.selected_row()
+        track = self.playlist_model.track_at(row)
+        if track is None:
             return
         
-        row = self.playlist.row(items[0])
-        track = self.tracks[row]
-        
         confirm = QMessageBox.question(self, "Delete Track", 
                                      f"Are you sure you want to delete '{track['title']}'?\nIt will not appear again.",
                                      QMessageBox.Yes | QMessageBox.No)
         
         if confirm == QMessageBox.Yes:
             self.db.mark_track_deleted(track['id'])
-            self.tracks.pop(row)
-            self.refresh_playlist()
+            self.playlist_model.remove_row(row)
+            if str(track['id']) == self.queued_track_id:
+                self.queue_next_track()
 
-    def play_track(self, item):
-        idx = self.playlist.row(item)
-        track = self.tracks[idx]
+    def play_track(self, index):
+        track = self.playlist_model.track_at(index.row())
+        if track is None:
+            return
         
-        audio_data = self.db.get_track_audio(track['id'])
+        # Whatever was still loading for the previous click is dropped
+        self.tasks.cancel("play")
+        self.prefetch.note_jump(track)
+        if self.db.get_track_audio_path(track['id']):
+            self.storage.record_hit()
+            self.prefetch.on_started(track['id'])
+            self.pending_track_id = None
+            self.start_playback(track)
+            return
         
-        if not audio_data:
-            self.info_label.setText(f"Downloading {track['title']}...")
-            QApplication.processEvents()
-            
-            audio_data = self.vk_client.download_track(track['url'])
-            if audio_data:
-                self.db.save_track_audio(track['id'], audio_data)
-            else:
-                QMessageBox.warning(self, "Error", "Failed to download track")
-                return
-
-        image_data = self.db.get_track_image(track['id'])
-        if not image_data and track.get('image_url'):
-            image_data = self.vk_client.download_image(track['image_url'])
-            if image_data:
-                self.db.save_track_image(track['id'], image_data)
-                self.refresh_playlist()
-        
-        if image_data:
-            pixmap = QPixmap()
-            pixmap.loadFromData(image_data)
-            self.art_label.setPixmap(pixmap.scaled(300, 300, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-        else:
-            self.art_label.clear()
-            self.art_label.setText("No Art")
+        self.storage.record_miss()
+        self.prefetch.record_miss()
+        self.pending_track_id = str(track['id'])
+        self.info_label.setText(f"Downloading {track['title']}...")
+        self.downloads.prioritize(track)
+
+    def start_playback(self, track):
+        self.tasks.submit(self._open_track, track, group="play",
+                          on_done=self.on_track_opened,
+                          on_discard=lambda opened: opened[1] and opened[1].close())
 
-        if audio_data and self.audio_engine.load_track(file_data=audio_data):
+    def _open_track(self, track):
+        audio_path = self.db.get_track_audio_path(track['id'])
+        if not audio_path:
+            return track, None
+        return track, self.audio_engine.open_track(file_path=audio_path, key=str(track['id']),
+                                                   gain_db=self.track_gain(track['id']))
+
+    def on_track_opened(self, opened):
+        track, source = opened
+        if self.audio_engine.load_source(source):
             self.audio_engine.play()
             self.controls.set_playing(True)
-            self.info_label.setText(f"{track['artist']}\n{track['title']}")
-            self.export_btn.setEnabled(True)
+            self.current_track_id = str(track['id'])
+            self.queued_track_id = None
+            self.storage.touch(self.current_track_id)
+            self.show_track_info(track)
+            self.queue_next_track()
+            self.plan_prefetch()
         else:
             QMessageBox.warning(self, "Error", "Failed to load track audio")
 
+    def queue_next_track(self):
+        # The engine switches to this track on its own when the current one
+        # ends; update_ui() only follows the change.
+        track = self.playlist_model.next_track(self.current_track_id) if self.current_track_id else None
+        audio_path = self.db.get_track_audio_path(track['id']) if track else None
+        
+        if audio_path is None:
+            self.queued_track_id = None
+            self.audio_engine.clear_next()
+        elif str(track['id']) != self.queued_track_id:
+            self.queued_track_id = str(track['id'])
+            self.audio_engine.queue_next(file_path=audio_path, key=self.queued_track_id,
+                                         gain_db=self.track_gain(track['id']))
+
+    def plan_prefetch(self):
+        following, previous = self.playlist_model.neighbors(
+            self.current_track_id, self.prefetch.ahead, self.prefetch.behind)
+        self.prefetch.plan(following, previous)
+
+    def track_gain(self, track_id):
+        loudness, peak = self.db.get_track_loudness(track_id)
+        return normalization_gain(loudness, peak)
+
+    def on_track_analyzed(self, audio_hash, loudness, peak):
+        for track_id in (self.current_track_id, self.queued_track_id):
+            if track_id:
+                gain_db = self.track_gain(track_id)
+                if gain_db is not None:
+                    self.audio_engine.set_track_gain(track_id, gain_db)
+
+    def on_analysis_progress(self, done, remaining):
+        if remaining:
+            self.statusBar().showMessage(f"Analyzing loudness: {done} done, {remaining} left")
+        else:
+            self.statusBar().clearMessage()
+
+    def show_track_info(self, track):
+        art = self.thumbnails.load_pixmap(track['id'], large=True)
+        if art is None and track.get('image_url'):
+            self.tasks.submit(self._fetch_art, track, group="art", on_done=self.on_art_fetched)
+        
+        if art is not None:
+            self.art_label.setPixmap(art)
+        else:
+            self.art_label.clear()
+            self.art_label.setText("No Art")
+        
+        self.info_label.setText(f"{track['artist']}\n{track['title']}")
+        self.show_peaks(str(track['id']))
+
+    def _fetch_art(self, track):
+        image_data = self.vk_client.download_image(track['image_url'])
+        if image_data and self.thumbnails.store(track['id'], image_data):
+            return str(track['id'])
+        return None
+
+    def on_art_fetched(self, track_id):
+        if track_id is None:
+            return
+        self.playlist_model.invalidate_thumbnail(track_id)
+        if track_id == self.current_track_id:
+            art = self.thumbnails.load_pixmap(track_id, large=True)
+            if art is not None:
+                self.art_label.setPixmap(art)
+
+    def show_peaks(self, track_id):
+        data = self.db.get_track_peaks(track_id)
+        self.controls.set_peaks(data)
+        if data is None and self.db.get_track_audio_path(track_id):
+            # Cached before peaks were stored on download: build them once now
+            self.tasks.submit(self._build_peaks, track_id, group="peaks", on_done=self.on_peaks_ready)
+
+    def _build_peaks(self, track_id):
+        self.downloads.store_peaks(track_id)
+        return track_id
+
+    def on_peaks_ready(self, track_id):
+        data = self.db.get_track_peaks(track_id)
+        if track_id == self.current_track_id and data is not None:
+            self.controls.set_peaks(data)
+
+    def cache_library(self):
+        queued = self.downloads.cache_library(self.playlist_model.library)
+        self.cache_btn.setText(f"Caching ({queued})..." if queued else "Cache Library")
+
+    def on_download_progress(self, track_id, done, total):
+        if track_id == self.pending_track_id and total:
+            track = self.playlist_model.find_track(track_id)
+            if track:
+                self.info_label.setText(f"Downloading {track['title']}... {done * 100 // total}%")
+
+    def on_download_finished(self, track_id):
+        self.update_cache_button()
+        self.storage.request()
+        self.loudness.start()
+        self.playlist_model.invalidate_thumbnail(track_id)
+        self.prefetch.on_finished(track_id, True)
+        if track_id == self.pending_track_id:
+            self.pending_track_id = None
+            track = self.playlist_model.find_track(track_id)
+            if track:
+                self.start_playback(track)
+        elif self.current_track_id and self.queued_track_id is None:
+            self.queue_next_track()
+
+    def on_download_failed(self, track_id):
+        self.update_cache_button()
+        self.prefetch.on_finished(track_id, False)
+        if track_id == self.pending_track_id:
+            self.pending_track_id = None
+            QMessageBox.warning(self, "Error", "Failed to download track")
+
+    def update_cache_button(self):
+        remaining = self.downloads.pending_count()
+        self.cache_btn.setText(f"Caching ({remaining})..." if remaining else "Cache Library")
+
     def seek(self, position_percent):
-        if self.audio_engine.data is not None:
-            total_seconds = len(self.audio_engine.data) / self.audio_engine.samplerate
+        if self.audio_engine.is_loaded():
+            total_seconds = self.audio_engine.get_duration()
             seek_seconds = position_percent * total_seconds
             self.audio_engine.seek(seek_seconds)
 
     def update_ui(self):
-        if self.audio_engine.playing and self.audio_engine.data is not None:
+        key = self.audio_engine.current_key()
+        if key and key != self.current_track_id:
+            self.current_track_id = key
+            self.storage.touch(key)
+            self.prefetch.on_started(key)
+            self.plan_prefetch()
+            track = self.playlist_model.find_track(key)
+            if track:
+                self.show_track_info(track)
+            self.queue_next_track()
+        
+        if self.audio_engine.playing and self.audio_engine.is_loaded():
             pos = self.audio_engine.position / self.audio_engine.samplerate
-            duration = len(self.audio_engine.data) / self.audio_engine.samplerate
+            duration = self.audio_engine.get_duration()
             if duration > 0:
                 self.controls.update_seek(pos / duration)
         elif not self.audio_engine.playing and self.controls.is_playing:
              self.controls.set_playing(False)
+        
+        stats = self.audio_engine.get_stats()
+        self.controls.set_underruns(stats['underruns'] + stats['output_underflows'])
+        self.update_storage_label()
+
+    def storage_keep_ids(self):
+        return (self.current_track_id, self.queued_track_id, self.pending_track_id, *self.prefetch.keep_ids())
+
+    def update_storage_budget(self, gigabytes):
+        self.storage.set_budget(gigabytes * 2**30)
+        self.db.set_setting("storage_budget_gb", str(gigabytes))
+
+    def update_pcm_cache(self, enabled):
+        self.db.set_setting("fast_replay", "1" if enabled else "0")
+        self.audio_engine.pcm_cache = self.pcm_cache if enabled else None
+        if not enabled:
+            self.pcm_cache.clear()
+            self.storage.request()
+
+    def update_storage_label(self):
+        stats = self.storage.get_stats()
+        text = f"Cache {stats['usage_bytes'] / 2**30:.1f} GB"
+        if stats['hit_rate'] is not None:
+            text += f", {stats['hit_rate'] * 100:.0f}% played offline"
+        prefetch = self.prefetch.get_stats()
+        pcm = self.pcm_cache.get_stats()
+        if prefetch['hit_rate'] is not None:
+            text += f", {prefetch['hit_rate'] * 100:.0f}% prefetched"
+        self.storage_label.setText(text)
+        self.storage_label.setToolTip(f"Hits {stats['hits']}, misses {stats['misses']}, "
+                                      f"evicted {stats['evicted']} ({stats['evicted_bytes'] / 2**20:.0f} MB)\n"
+                                      f"Prefetch: {prefetch['hits']} started from prefetch, "
+                                      f"{prefetch['fetched']} fetched, {prefetch['failed']} failed\n"
+                                      f"Fast replay: {pcm['memory_hits']} from memory, "
+                                      f"{pcm['disk_hits']} from disk, {pcm['misses']} decoded")
+
+    def closeEvent(self, event):
+        if self.export_batch:
+            self.export_batch.cancel()
+        self.tasks.cancel_all()
+        self.loudness.stop()
+        self.spectrum.stop()
+        self.storage.stop()
+        self.watchdog.stop()
+        self.downloads.shutdown(timeout=2.0)
+        if not self.tasks.wait(2000):
+            print("Background tasks still running at exit")
+        self.db.set_setting("eq_gains", json.dumps(self.audio_engine.eq.gains))
+        self.audio_engine.close()
+        self.db.close()
+        super().closeEvent(event)
+
+    def update_spectrum(self):
+        frame, bars, levels = self.spectrum.snapshot()
+        if frame != self.spectrum_frame:
+            self.spectrum_frame = frame
+            self.effects_panel.spectrum.set_frame(bars, levels)
 
     def update_eq(self, band, gain):
+        # Coalesced and smoothed by the equalizer on the render thread
         self.audio_engine.eq.set_gain(band, gain)
 
+    def eq_presets(self):
+        presets = dict(EQ_PRESETS)
+        presets.update(self.db.get_eq_presets())
+        return presets
+
+    def refresh_eq_presets(self, current=None):
+        self.effects_panel.set_presets(list(self.eq_presets()), current)
+
+    def apply_eq_preset(self, name):
+        gains = self.eq_presets().get(name)
+        if gains is None:
+            return
+        self.audio_engine.eq.set_gains(gains)
+        self.effects_panel.set_gains(gains)
+        self.db.set_setting("eq_preset", name)
+
+    def save_eq_preset(self, name):
+        if name in EQ_PRESETS:
+            QMessageBox.warning(self, "Error", f"'{name}' is a built-in preset")
+            return
+        self.db.save_eq_preset(name, self.audio_engine.eq.gains)
+        self.db.set_setting("eq_preset", name)
+        self.refresh_eq_presets(name)
+
+    def delete_eq_preset(self, name):
+        if name in EQ_PRESETS:
+            return
+        self.db.delete_eq_preset(name)
+        self.refresh_eq_presets()
+
     def update_speed(self, factor):
         self.audio_engine.set_speed(factor)
 
-    def export_current_track(self):
-        if self.audio_engine.data is None:
+    def update_pitch_correction(self, enabled):
+        self.audio_engine.pitch_correction = enabled
+
+    def update_normalize(self, enabled):
+        self.audio_engine.normalize = enabled
+        self.db.set_setting("normalize", "1" if enabled else "0")
+
+    def update_crossfade(self, seconds):
+        self.audio_engine.set_crossfade(seconds)
+        self.db.set_setting("crossfade", str(seconds))
+
+    def selected_tracks(self):
+        rows = sorted(index.row() for index in self.playlist.selectionModel().selectedIndexes())
+        return [self.playlist_model.track_at(row) for row in rows]
+
+    def export_selected_tracks(self):
+        if self.export_batch and self.export_batch.is_running():
+            self.export_batch.cancel()
+            self.export_btn.setText("Cancelling...")
+            self.export_btn.setEnabled(False)
             return
-            
-        items = self.playlist.selectedItems()
-        if not items:
-            QMessageBox.warning(self, "Export", "No track selected")
+        self.export_tracks(self.selected_tracks())
+
+    def export_all_tracks(self):
+        if not (self.export_batch and self.export_batch.is_running()):
+            self.export_tracks(self.playlist_model.tracks)
+
+    def export_tracks(self, tracks):
+        # One DB lookup per track adds up for a whole library
+        self.export_btn.setEnabled(False)
+        self.tasks.submit(self._export_jobs, list(tracks), group="export", on_done=self.start_export,
+                          on_error=lambda message: self.start_export([]))
+
+    def _export_jobs(self, tracks):
+        jobs = []
+        for track in tracks:
+            audio_path = self.db.get_track_audio_path(track['id'])
+            if audio_path:
+                safe_title = f"{track['artist']} - {track['title']}".replace("/", "_").replace("\\", "_")
+                jobs.append((str(track['id']), audio_path, f"{safe_title}_processed.mp3",
+                             self.track_gain(track['id'])))
+        return jobs
+
+    def start_export(self, jobs):
+        self.export_btn.setEnabled(True)
+        if not jobs:
+            QMessageBox.warning(self, "Export", "No downloaded tracks selected")
             return
-            
-        idx = self.playlist.row(items[0])
-        track = self.tracks[idx]
-        
-        safe_title = f"{track['artist']} - {track['title']}".replace("/", "_").replace("\\", "_")
-        output_filename = f"{safe_title}_processed.mp3"
         
-        self.export_btn.setText("Exporting...")
-        self.export_btn.setEnabled(False)
-        QApplication.processEvents()
-        
-        out_path = self.exporter.export_track(
-            self.audio_engine.data,
-            self.audio_engine.samplerate,
-            output_filename,
-            self.audio_engine.speed,
-            self.audio_engine.eq.board,
-            self.audio_engine.limiter.board
+        self.export_progress = {job[0]: 0.0 for job in jobs}
+        self.export_btn.setText("Cancel Export (0%)")
+        self.export_batch = self.exporter.export_batch(
+            jobs,
+            effect_settings(self.audio_engine),
+            on_progress=self.export_signals.progress.emit,
+            on_finished=self.export_signals.finished.emit,
+            on_done=self.export_signals.done.emit
         )
-        
-        self.export_btn.setText("Export Processed Track")
+
+    def on_export_progress(self, job_id, fraction):
+        if job_id in self.export_progress and self.export_btn.isEnabled():
+            self.export_progress[job_id] = fraction
+            percent = int(100 * sum(self.export_progress.values()) / len(self.export_progress))
+            self.export_btn.setText(f"Cancel Export ({percent}%)")
+
+    def on_export_finished(self, job_id, path):
+        self.on_export_progress(job_id, 1.0)
+
+    def on_export_done(self, completed, failed):
+        self.export_btn.setText("Export Selected")
         self.export_btn.setEnabled(True)
         
-        if out_path:
-            QMessageBox.information(self, "Export", f"Exported to:\n{out_path}")
-        else:
-            QMessageBox.critical(self, "Export", "Export failed")
+        if failed:
+            QMessageBox.critical(self, "Export", f"Exported {completed} track(s), {failed} failed")
+        elif completed:
+            QMessageBox.information(self, "Export", f"Exported {completed} track(s) to:\n{os.path.abspath(self.exporter.output_dir)}")
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -1,5 +1,6 @@
 from PySide6.QtWidgets import QWidget, QHBoxLayout, QPushButton, QSlider, QLabel
 from PySide6.QtCore import Qt, Signal
+from .waveform_bar import WaveformBar
 
 class PlayerControls(QWidget):
     play_clicked = Signal()
@@ -16,9 +17,8 @@ class PlayerControls(QWidget):
         self.play_btn.clicked.connect(self.toggle_play)
         self.is_playing = False
         
-        self.seek_slider = QSlider(Qt.Horizontal)
-        self.seek_slider.setRange(0, 1000)
-        self.seek_slider.sliderReleased.connect(self.on_seek)
+        self.waveform = WaveformBar()
+        self.waveform.seek_requested.connect(self.seek_changed.emit)
         
         self.vol_label = QLabel("Vol")
         self.vol_slider = QSlider(Qt.Horizontal)
@@ -27,10 +27,14 @@ class PlayerControls(QWidget):
         self.vol_slider.setValue(100)
         self.vol_slider.valueChanged.connect(self.on_volume)
         
+        self.underrun_label = QLabel("")
+        self.underrun_label.setStyleSheet("color: #888;")
+        
         self.layout.addWidget(self.play_btn)
-        self.layout.addWidget(self.seek_slider)
+        self.layout.addWidget(self.waveform, stretch=1)
         self.layout.addWidget(self.vol_label)
         self.layout.addWidget(self.vol_slider)
+        self.layout.addWidget(self.underrun_label)
         
     def toggle_play(self):
         if self.is_playing:
@@ -45,14 +49,15 @@ class PlayerControls(QWidget):
         self.is_playing = playing
         self.play_btn.setText("Pause" if playing else "Play")
 
-    def on_seek(self):
-        val = self.seek_slider.value() / 1000.0
-        self.seek_changed.emit(val)
-
     def on_volume(self):
         val = self.vol_slider.value() / 100.0
         self.volume_changed.emit(val)
         
     def update_seek(self, percent):
-        if not self.seek_slider.isSliderDown():
-            self.seek_slider.setValue(int(percent * 1000))
+        self.waveform.set_position(percent)
+
+    def set_peaks(self, data):
+        self.waveform.set_peaks(data)
+
+    def set_underruns(self, count):
+        self.underrun_label.setText(f"Dropouts: {count}" if count else "")
@@ -0,0 +1,218 @@
+from PySide6.QtCore import (Qt, QAbstractListModel, QModelIndex, QObject, QRunnable,
+                            QThreadPool, Signal)
+from PySide6.QtGui import QImage, QPixmap, QIcon, QPainter, QBrush, QColor
+
+TrackRole = Qt.UserRole + 1
+
+def placeholder_pixmap(size=48):
+    pixmap = QPixmap(size, size)
+    pixmap.fill(Qt.transparent)
+
+    painter = QPainter(pixmap)
+    painter.setRenderHint(QPainter.Antialiasing)
+
+    painter.setBrush(QBrush(QColor("#444")))
+    painter.setPen(Qt.NoPen)
+    painter.drawEllipse(0, 0, size, size)
+
+    painter.setPen(QColor("#888"))
+    painter.setBrush(Qt.NoBrush)
+    font = painter.font()
+    font.setPixelSize(int(size * 0.6))
+    painter.setFont(font)
+    painter.drawText(0, 0, size, size, Qt.AlignCenter, "♪")
+
+    painter.end()
+    return pixmap
+
+class ThumbnailSignals(QObject):
+    loaded = Signal(str, QImage)
+
+class ThumbnailLoader(QRunnable):
+    def __init__(self, thumbnails, track_id, signals):
+        super().__init__()
+        self.thumbnails = thumbnails
+        self.track_id = track_id
+        self.signals = signals
+
+    def run(self):
+        try:
+            image = self.thumbnails.load_image(self.track_id)
+        except Exception as e:
+            print(f"Thumbnail load failed for {self.track_id}: {e}")
+            image = QImage()
+        self.signals.loaded.emit(self.track_id, image)
+
+class PlaylistModel(QAbstractListModel):
+    def __init__(self, thumbnails, parent=None):
+        super().__init__(parent)
+        self.thumbnails = thumbnails
+        # `library` holds every track; `tracks` is the filtered view shown
+        self.library = []
+        self.tracks = []
+        self._filter = None
+        self._rows = None
+        self._library_rows = None
+        self._missing = set()
+        self._requested = set()
+        self._placeholder = None
+        self.thread_pool = QThreadPool.globalInstance()
+        self.thumbnail_signals = ThumbnailSignals()
+        self.thumbnail_signals.loaded.connect(self._on_thumbnail_loaded)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tracks)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.tracks):
+            return None
+        track = self.tracks[index.row()]
+
+        if role == Qt.DisplayRole:
+            return f"{track['artist']} - {track['title']}"
+        if role == Qt.DecorationRole:
+            return self._icon_for(str(track['id']))
+        if role == TrackRole:
+            return track
+        return None
+
+    def track_at(self, row):
+        if 0 <= row < len(self.tracks):
+            return self.tracks[row]
+        return None
+
+    def row_of(self, track_id):
+        if self._rows is None:
+            self._rows = {str(t['id']): i for i, t in enumerate(self.tracks)}
+        return self._rows.get(str(track_id), -1)
+
+    def _library_index(self):
+        if self._library_rows is None:
+            self._library_rows = {str(t['id']): i for i, t in enumerate(self.library)}
+        return self._library_rows
+
+    def library_row_of(self, track_id):
+        return self._library_index().get(str(track_id), -1)
+
+    def find_track(self, track_id):
+        # Also finds tracks hidden by the filter, e.g. the one playing
+        row = self.library_row_of(track_id)
+        return self.library[row] if row >= 0 else None
+
+    def neighbors(self, track_id, after, before=0):
+        # The tracks following and preceding this one (nearest first), in
+        # the same order next_track() walks
+        tracks, row = self.tracks, self.row_of(track_id)
+        if row < 0:
+            tracks, row = self.library, self.library_row_of(track_id)
+        if row < 0:
+            return [], []
+        return tracks[row + 1:row + 1 + after], tracks[max(row - before, 0):row][::-1]
+
+    def next_track(self, track_id):
+        row = self.row_of(track_id)
+        if row >= 0:
+            return self.track_at(row + 1)
+        row = self.library_row_of(track_id)
+        return self.library[row + 1] if 0 <= row < len(self.library) - 1 else None
+
+    def set_tracks(self, tracks):
+        self.beginResetModel()
+        self.library = list(tracks)
+        self._library_rows = None
+        self.tracks = self._visible(self.library)
+        self._rows = None
+        self.endResetModel()
+
+    def set_filter(self, track_ids):
+        # track_ids: string ids to show, in library order (as search returns
+        # them), or None to show everything
+        self.beginResetModel()
+        if track_ids is None:
+            self._filter = None
+            self.tracks = list(self.library)
+        else:
+            self._filter = track_ids
+            rows = map(self._library_index().get, track_ids)
+            self.tracks = [self.library[row] for row in rows if row is not None]
+        self._rows = None
+        self.endResetModel()
+
+    def _visible(self, tracks):
+        if self._filter is None:
+            return list(tracks)
+        shown = set(self._filter)
+        return [t for t in tracks if str(t['id']) in shown]
+
+    def merge_tracks(self, tracks):
+        new_tracks = []
+        for t in tracks:
+            if self.library_row_of(t['id']) < 0:
+                new_tracks.append(t)
+                continue
+            self.library[self.library_row_of(t['id'])].update(t)
+            row = self.row_of(t['id'])
+            if row >= 0:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+        if new_tracks:
+            self.library.extend(new_tracks)
+            self._library_rows = None
+            shown = self._visible(new_tracks)
+            if shown:
+                first = len(self.tracks)
+                self.beginInsertRows(QModelIndex(), first, first + len(shown) - 1)
+                self.tracks.extend(shown)
+                self._rows = None
+                self.endInsertRows()
+        return new_tracks
+
+    def remove_row(self, row):
+        if not 0 <= row < len(self.tracks):
+            return None
+        self.beginRemoveRows(QModelIndex(), row, row)
+        track = self.tracks.pop(row)
+        self._rows = None
+        self.endRemoveRows()
+        library_row = self.library_row_of(track['id'])
+        if library_row >= 0:
+            self.library.pop(library_row)
+            self._library_rows = None
+
+        self.thumbnails.invalidate(track['id'])
+        return track
+
+    def invalidate_thumbnail(self, track_id):
+        track_id = str(track_id)
+        self.thumbnails.invalidate(track_id)
+        self._missing.discard(track_id)
+        row = self.row_of(track_id)
+        if row >= 0:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def _icon_for(self, track_id):
+        pixmap = self.thumbnails.get_pixmap(track_id)
+        if pixmap is not None:
+            return QIcon(pixmap)
+        if track_id not in self._requested and track_id not in self._missing:
+            self._requested.add(track_id)
+            self.thread_pool.start(ThumbnailLoader(self.thumbnails, track_id, self.thumbnail_signals))
+        return self._placeholder_icon()
+
+    def _placeholder_icon(self):
+        if self._placeholder is None:
+            self._placeholder = QIcon(placeholder_pixmap())
+        return self._placeholder
+
+    def _on_thumbnail_loaded(self, track_id, image):
+        self._requested.discard(track_id)
+        if image.isNull():
+            self._missing.add(track_id)
+            return
+        self.thumbnails.put_image(track_id, image)
+        row = self.row_of(track_id)
+        if row >= 0:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
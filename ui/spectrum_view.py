@@ -0,0 +1,46 @@
+from PySide6.QtWidgets import QWidget
+from PySide6.QtCore import QRectF
+from PySide6.QtGui import QPainter, QColor
+
+BAR_COLOR = QColor("#007acc")
+LEVEL_COLOR = QColor("#4ec9b0")
+CLIP_COLOR = QColor("#f44747")
+BACKGROUND_COLOR = QColor("#252526")
+
+class SpectrumView(QWidget):
+    # Draws the latest SpectrumAnalyzer frame: bars on the left, one peak
+    # meter per channel on the right.
+    def __init__(self, floor_db=-80.0):
+        super().__init__()
+        self.setMinimumHeight(60)
+        self.floor_db = floor_db
+        self.bars = []
+        self.levels = []
+
+    def set_frame(self, bars, levels):
+        self.bars = bars.tolist()
+        self.levels = levels.tolist()
+        self.update()
+
+    def _fraction(self, db):
+        return min(max(1.0 - db / self.floor_db, 0.0), 1.0)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        width, height = self.width(), self.height()
+        painter.fillRect(0, 0, width, height, BACKGROUND_COLOR)
+
+        meter_width = 6
+        meters = len(self.levels) * (meter_width + 2)
+        if self.bars:
+            slot = (width - meters - 4) / len(self.bars)
+            for i, db in enumerate(self.bars):
+                bar = self._fraction(db) * height
+                painter.fillRect(QRectF(i * slot + 1, height - bar, max(slot - 2, 1.0), bar), BAR_COLOR)
+
+        for i, db in enumerate(self.levels):
+            x = width - meters + i * (meter_width + 2)
+            level = self._fraction(db) * height
+            painter.fillRect(QRectF(x, height - level, meter_width, level),
+                             CLIP_COLOR if db >= -0.1 else LEVEL_COLOR)
+        painter.end()
@@ -11,23 +11,23 @@ QWidget {
     font-size: 14px;
 }
 
-QListWidget {
+QListView {
     background-color: #252526;
     border: none;
     outline: none;
 }
 
-QListWidget::item {
+QListView::item {
     padding: 10px;
     border-bottom: 1px solid #333;
 }
 
-QListWidget::item:selected {
+QListView::item:selected {
     background-color: #37373d;
     color: #ffffff;
 }
 
-QListWidget::item:hover {
+QListView::item:hover {
     background-color: #2a2d2e;
 }
 
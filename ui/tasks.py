@@ -0,0 +1,159 @@
+import itertools
+import sys
+import threading
+import time
+import traceback
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal
+
+class TaskSignals(QObject):
+    finished = Signal(int, object)
+    failed = Signal(int, str)
+
+class Task(QRunnable):
+    def __init__(self, task_id, fn, args, token, signals):
+        super().__init__()
+        self.task_id = task_id
+        self.fn = fn
+        self.args = args
+        self.token = token
+        self.signals = signals
+
+    def run(self):
+        if self.token.cancelled:
+            self._emit(self.signals.finished, None)
+            return
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            self._emit(self.signals.failed, f"{e}")
+            return
+        self._emit(self.signals.finished, result)
+
+    def _emit(self, signal, value):
+        try:
+            signal.emit(self.task_id, value)
+        except RuntimeError:
+            # The window closed while this was running; nobody is listening
+            pass
+
+class CancelToken:
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class TaskRunner(QObject):
+    # Runs blocking work (network, disk, decoding) on a thread pool and hands
+    # the result back on the GUI thread. Submitting to a group cancels the
+    # group's previous task: it may still finish, but its result goes to
+    # on_discard (to release it) instead of on_done.
+    def __init__(self, pool=None):
+        super().__init__()
+        self.pool = pool or QThreadPool.globalInstance()
+        self.signals = TaskSignals()
+        self.signals.finished.connect(self._on_finished)
+        self.signals.failed.connect(self._on_failed)
+        self._ids = itertools.count(1)
+        self._tasks = {}
+        self._groups = {}
+
+    def submit(self, fn, *args, group=None, on_done=None, on_error=None, on_discard=None):
+        if group is not None:
+            self.cancel(group)
+        task_id = next(self._ids)
+        token = CancelToken()
+        self._tasks[task_id] = (token, group, on_done, on_error, on_discard)
+        if group is not None:
+            self._groups[group] = task_id
+        self.pool.start(Task(task_id, fn, args, token, self.signals))
+        return token
+
+    def cancel(self, group):
+        task_id = self._groups.pop(group, None)
+        if task_id in self._tasks:
+            self._tasks[task_id][0].cancel()
+
+    def cancel_all(self):
+        for token, *_ in self._tasks.values():
+            token.cancel()
+        self._groups.clear()
+
+    def wait(self, timeout_ms):
+        # False if tasks were still running when the timeout ran out
+        return self.pool.waitForDone(timeout_ms)
+
+    def is_running(self, group):
+        return group in self._groups
+
+    def _release(self, task_id):
+        entry = self._tasks.pop(task_id, None)
+        if entry is not None and entry[1] is not None and self._groups.get(entry[1]) == task_id:
+            del self._groups[entry[1]]
+        return entry
+
+    def _on_finished(self, task_id, result):
+        entry = self._release(task_id)
+        if entry is None:
+            return
+        token, _, on_done, _, on_discard = entry
+        if token.cancelled:
+            if on_discard is not None and result is not None:
+                on_discard(result)
+        elif on_done is not None:
+            on_done(result)
+
+    def _on_failed(self, task_id, message):
+        entry = self._release(task_id)
+        if entry is None or entry[0].cancelled:
+            return
+        if entry[3] is not None:
+            entry[3](message)
+        else:
+            print(f"Background task failed: {message}")
+
+class StallWatchdog:
+    # A timer on the GUI thread stamps a heartbeat. A plain thread notices
+    # when the heartbeat stops and prints where the GUI thread is stuck; the
+    # next beat prints how long the event loop was blocked.
+    def __init__(self, threshold_ms=200, interval_ms=50):
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.stalls = 0
+        self.longest_ms = 0.0
+        self._beat_time = time.monotonic()
+        self._reported = False
+        self._running = False
+        self._gui_thread = threading.get_ident()
+        self.timer = QTimer()
+        self.timer.timeout.connect(self._beat)
+
+    def start(self):
+        self._beat_time = time.monotonic()
+        self._running = True
+        self.timer.start(int(self.interval * 1000))
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        self.timer.stop()
+
+    def _beat(self):
+        now = time.monotonic()
+        blocked = now - self._beat_time - self.interval
+        if blocked > self.threshold:
+            self.stalls += 1
+            self.longest_ms = max(self.longest_ms, blocked * 1000)
+            print(f"UI thread was blocked for {blocked * 1000:.0f} ms")
+        self._beat_time = now
+        self._reported = False
+
+    def _watch(self):
+        while self._running:
+            time.sleep(self.threshold / 2)
+            if self._reported or time.monotonic() - self._beat_time < self.interval + self.threshold:
+                continue
+            self._reported = True
+            frame = sys._current_frames().get(self._gui_thread)
+            stack = "".join(traceback.format_stack(frame)[-6:]) if frame is not None else ""
+            print(f"UI thread stalled for over {self.threshold * 1000:.0f} ms in:\n{stack}")
@@ -0,0 +1,130 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from PySide6.QtCore import Qt, QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QImage, QPixmap, QPainter, QPainterPath
+
+THUMB_SIZE = 48
+ART_SIZE = 300
+
+def encode_image(image, fmt, quality=-1):
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, fmt, quality)
+    buffer.close()
+    return bytes(data)
+
+def rounded_image(image, size=48, radius=24):
+    scaled = image.scaled(size, size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
+
+    if scaled.width() > size or scaled.height() > size:
+        x = (scaled.width() - size) // 2
+        y = (scaled.height() - size) // 2
+        scaled = scaled.copy(x, y, size, size)
+
+    rounded = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+    rounded.fill(Qt.transparent)
+
+    painter = QPainter(rounded)
+    painter.setRenderHint(QPainter.Antialiasing)
+
+    path = QPainterPath()
+    path.addRoundedRect(0, 0, size, size, radius, radius)
+
+    painter.setClipPath(path)
+    painter.drawImage(0, 0, scaled)
+    painter.end()
+
+    return rounded
+
+def render_variants(image_data):
+    image = QImage()
+    if not image.loadFromData(image_data):
+        return None, None
+    thumb = rounded_image(image, THUMB_SIZE, THUMB_SIZE // 2)
+    art = image.scaled(ART_SIZE, ART_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return encode_image(thumb, "PNG"), encode_image(art.convertToFormat(QImage.Format_RGB32), "JPG", 90)
+
+class PixmapLRU:
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.items = OrderedDict()
+
+    def get(self, key):
+        pixmap = self.items.get(key)
+        if pixmap is not None:
+            self.items.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        self.discard(key)
+        cost = self.cost(pixmap)
+        if cost > self.budget_bytes:
+            return
+        self.items[key] = pixmap
+        self.used_bytes += cost
+        while self.used_bytes > self.budget_bytes:
+            _, evicted = self.items.popitem(last=False)
+            self.used_bytes -= self.cost(evicted)
+
+    def discard(self, key):
+        pixmap = self.items.pop(key, None)
+        if pixmap is not None:
+            self.used_bytes -= self.cost(pixmap)
+
+    def cost(self, pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+class ThumbnailCache:
+    def __init__(self, db, budget_bytes=16 * 1024 * 1024):
+        self.db = db
+        self.pixmaps = PixmapLRU(budget_bytes)
+        self._lock = threading.Lock()
+
+    def store(self, track_id, image_data):
+        digest = hashlib.sha256(image_data).hexdigest()
+        thumb = art = None
+        # Covers shared by a whole album are rendered and stored once
+        if not self.db.has_image(digest):
+            thumb, art = render_variants(image_data)
+            if thumb is None:
+                return False
+        self.db.save_track_image(track_id, digest, thumb, art)
+        return True
+
+    def load_image(self, track_id, large=False):
+        data = self.db.get_track_thumbnail(track_id, large)
+        if data is None:
+            legacy = self.db.get_legacy_track_image(track_id)
+            if legacy and self.store(track_id, legacy):
+                data = self.db.get_track_thumbnail(track_id, large)
+        image = QImage()
+        if data:
+            image.loadFromData(data)
+        return image
+
+    def get_pixmap(self, track_id, large=False):
+        with self._lock:
+            return self.pixmaps.get((str(track_id), large))
+
+    def put_image(self, track_id, image, large=False):
+        pixmap = QPixmap.fromImage(image)
+        with self._lock:
+            self.pixmaps.put((str(track_id), large), pixmap)
+        return pixmap
+
+    def load_pixmap(self, track_id, large=False):
+        pixmap = self.get_pixmap(track_id, large)
+        if pixmap is None:
+            image = self.load_image(track_id, large)
+            if image.isNull():
+                return None
+            pixmap = self.put_image(track_id, image, large)
+        return pixmap
+
+    def invalidate(self, track_id):
+        with self._lock:
+            self.pixmaps.discard((str(track_id), False))
+            self.pixmaps.discard((str(track_id), True))
@@ -0,0 +1,116 @@
+from PySide6.QtWidgets import QWidget
+from PySide6.QtCore import Qt, Signal, QLineF
+from PySide6.QtGui import QPainter, QColor, QPen
+
+from core.waveform import PeakPyramid
+
+PLAYED_COLOR = QColor("#007acc")
+REMAINING_COLOR = QColor("#555555")
+CURSOR_COLOR = QColor("#ffffff")
+
+class WaveformBar(QWidget):
+    # Seek bar drawn from a precomputed peak pyramid. Click or drag to seek,
+    # wheel to zoom around the cursor, double-click to show the whole track.
+    seek_requested = Signal(float)
+
+    MIN_SPAN = 0.002
+
+    def __init__(self):
+        super().__init__()
+        self.setMinimumHeight(48)
+        self.peaks = None
+        self.position = 0.0
+        self.view = (0.0, 1.0)
+        self.dragging = False
+        self._columns_key = None
+        self._columns = None
+
+    def set_peaks(self, data):
+        self.peaks = PeakPyramid.from_bytes(data) if isinstance(data, bytes) else data
+        self.view = (0.0, 1.0)
+        self._columns_key = None
+        self.update()
+
+    def set_position(self, fraction):
+        if self.dragging:
+            return
+        self.position = min(max(fraction, 0.0), 1.0)
+        start, end = self.view
+        if not start <= self.position <= end:
+            # Page the zoomed view along with playback
+            span = end - start
+            start = min(max(self.position - span * 0.1, 0.0), 1.0 - span)
+            self.view = (start, start + span)
+        self.update()
+
+    def _fraction_at(self, x):
+        start, end = self.view
+        return min(max(start + (end - start) * x / max(self.width(), 1), 0.0), 1.0)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.dragging = True
+            self.position = self._fraction_at(event.position().x())
+            self.update()
+
+    def mouseMoveEvent(self, event):
+        if self.dragging:
+            self.position = self._fraction_at(event.position().x())
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        if self.dragging and event.button() == Qt.LeftButton:
+            self.dragging = False
+            self.position = self._fraction_at(event.position().x())
+            self.seek_requested.emit(self.position)
+            self.update()
+
+    def mouseDoubleClickEvent(self, event):
+        self.view = (0.0, 1.0)
+        self.update()
+
+    def wheelEvent(self, event):
+        start, end = self.view
+        anchor = self._fraction_at(event.position().x())
+        scale = 0.8 ** (event.angleDelta().y() / 120.0)
+        span = min(max((end - start) * scale, self.MIN_SPAN), 1.0)
+        ratio = (anchor - start) / (end - start)
+        start = min(max(anchor - span * ratio, 0.0), 1.0 - span)
+        self.view = (start, start + span)
+        self.update()
+
+    def _visible_columns(self):
+        key = (self.width(), self.view, id(self.peaks))
+        if key != self._columns_key:
+            self._columns_key = key
+            self._columns = self.peaks.columns(self.width(), *self.view) if self.peaks else None
+        return self._columns
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        width, height = self.width(), self.height()
+        middle = height / 2.0
+        start, end = self.view
+        cursor = int((self.position - start) / (end - start) * width)
+
+        columns = self._visible_columns()
+        if columns is None:
+            painter.setPen(QPen(REMAINING_COLOR, 2))
+            painter.drawLine(0, int(middle), width, int(middle))
+            painter.setPen(QPen(PLAYED_COLOR, 2))
+            painter.drawLine(0, int(middle), max(cursor, 0), int(middle))
+        else:
+            lows, highs = columns
+            scale = middle - 1.0
+            lines = [QLineF(x + 0.5, middle - high * scale, x + 0.5, middle - low * scale + 1.0)
+                     for x, (low, high) in enumerate(zip(lows.tolist(), highs.tolist()))]
+            split = min(max(cursor, 0), len(lines))
+            painter.setPen(PLAYED_COLOR)
+            painter.drawLines(lines[:split])
+            painter.setPen(REMAINING_COLOR)
+            painter.drawLines(lines[split:])
+
+        if 0 <= cursor <= width:
+            painter.setPen(CURSOR_COLOR)
+            painter.drawLine(cursor, 0, cursor, height)
+        painter.end()